@@ -0,0 +1,87 @@
+import time
+import asyncio
+import threading
+import traceback
+
+class AsyncEngine:
+    """One background event loop that runs analysis coroutines.
+
+    Callers on other threads (watchdog, pipeline dispatchers) hand work over
+    with submit(). At most max_in_flight coroutines run at once; submit()
+    blocks while the limit is reached, which keeps the backpressure of the
+    pipeline queues intact. stop() cancels everything still in flight."""
+
+    def __init__(self, max_in_flight=64):
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.slots = threading.BoundedSemaphore(self.max_in_flight)
+        self.loop = None
+        self.thread = None
+        self.tasks = set()
+        self.closed = False
+
+    def start(self):
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.call_soon(ready.set)
+            self.loop.run_forever()
+        self.thread = threading.Thread(target=run, name="async-engine", daemon=True)
+        self.thread.start()
+        ready.wait()
+
+    def submit(self, coro):
+        """Schedule coro on the loop; returns a concurrent.futures.Future, or None once stopped."""
+        self.slots.acquire()
+        if self.closed:
+            self.slots.release()
+            coro.close()
+            return None
+        try:
+            return asyncio.run_coroutine_threadsafe(self._run(coro), self.loop)
+        except RuntimeError:
+            self.slots.release()
+            coro.close()
+            return None
+
+    async def _run(self, coro):
+        task = asyncio.current_task()
+        self.tasks.add(task)
+        try:
+            return await coro
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Async Error: {e}")
+            traceback.print_exc()
+        finally:
+            self.tasks.discard(task)
+            self.slots.release()
+
+    def drain(self, timeout=None):
+        """Block until every submitted coroutine has finished. False on timeout."""
+        # Holding every slot means nothing is in flight.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        taken = 0
+        try:
+            for _ in range(self.max_in_flight):
+                remaining = None if deadline is None else max(0, deadline - time.monotonic())
+                if not self.slots.acquire(timeout=remaining): return False
+                taken += 1
+            return True
+        finally:
+            for _ in range(taken): self.slots.release()
+
+    def stop(self):
+        if self.loop is None or self.closed: return
+        self.closed = True
+        async def cancel_all():
+            tasks = [t for t in self.tasks if t is not asyncio.current_task()]
+            for t in tasks: t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            asyncio.run_coroutine_threadsafe(cancel_all(), self.loop).result(timeout=10)
+        except Exception as e:
+            print(f"Async Stop Error: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=10)
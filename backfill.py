@@ -0,0 +1,177 @@
+import os
+import sys
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from core import ScreenshotHandler, Recorder, folder_description, load_app_config, load_json, load_stats, CONFIG_FILE
+from history_log import HistoryLog
+from catalog import Catalog
+import metrics
+
+BACKFILL_CHECKPOINT_FILE = "backfill_checkpoint.txt"
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg')
+
+def scan(folder):
+    """Image files directly in folder, oldest first."""
+    entries = []
+    with os.scandir(folder) as it:
+        for entry in it:
+            if entry.is_file(follow_symlinks=False) and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTS:
+                entries.append((entry.stat().st_mtime, entry.path))
+    entries.sort()
+    return [p for _, p in entries]
+
+def _norm(path):
+    return os.path.normcase(os.path.abspath(path))
+
+class Checkpoint:
+    """Append-only list of source paths already handled by a backfill of one folder.
+
+    The first line records the folder; one path per line follows, flushed as
+    each file finishes, so a killed run loses at most the files in flight."""
+
+    def __init__(self, folder, path=BACKFILL_CHECKPOINT_FILE):
+        self.folder = _norm(folder)
+        self.path = path
+        self.done = set()
+        self.lock = threading.Lock()
+        self.file = None
+
+    def load(self):
+        if not os.path.exists(self.path): return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                header = f.readline().strip()
+                if header != self.folder: return  # checkpoint of another folder
+                self.done = {line.rstrip("\n") for line in f if line.strip()}
+        except Exception as e: print(f"Checkpoint Load Error: {e}")
+
+    def open(self):
+        fresh = not os.path.exists(self.path) or not self.done
+        self.file = open(self.path, 'w' if fresh else 'a', encoding='utf-8')
+        if fresh: self.file.write(self.folder + "\n")
+        self.file.flush()
+
+    def mark(self, paths):
+        with self.lock:
+            for p in paths:
+                self.done.add(_norm(p))
+                self.file.write(_norm(p) + "\n")
+            self.file.flush()
+
+    def close(self, finished):
+        if self.file: self.file.close()
+        self.file = None
+        if finished and os.path.exists(self.path): os.remove(self.path)
+
+    def __contains__(self, path):
+        return _norm(path) in self.done
+
+class Backfill:
+    """Runs every not-yet-processed image in a folder through ScreenshotHandler.process_images.
+
+    Files whose path is already in history (or in the checkpoint of an
+    interrupted run) are skipped."""
+
+    def __init__(self, handler, folder, history, workers=4, batch_size=4, checkpoint_path=BACKFILL_CHECKPOINT_FILE):
+        self.handler = handler
+        self.folder = folder
+        self.history = history  # iterable of history entries, read by run() rather than here
+        self.workers = max(1, int(workers))
+        self.batch_size = max(1, int(batch_size))
+        self.checkpoint = Checkpoint(folder, checkpoint_path)
+        self.cancelled = threading.Event()
+
+    def todo(self):
+        self.checkpoint.load()
+        known = {_norm(item["path"]) for item in self.history if item.get("path")}
+        return [p for p in scan(self.folder) if _norm(p) not in known and p not in self.checkpoint]
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def run(self, progress=None):
+        """Blocks until done or cancelled. progress(done, total) is called after every batch."""
+        files = self.todo()
+        total, done = len(files), 0
+        if progress: progress(0, total)
+        if not files:
+            self.checkpoint.close(True)
+            return 0, 0
+
+        self.checkpoint.open()
+        batches = [files[i:i + self.batch_size] for i in range(0, total, self.batch_size)]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            # Keep only a few batches queued so cancel() takes effect quickly.
+            running = set()
+            it = iter(batches)
+            while True:
+                while not self.cancelled.is_set() and len(running) < self.workers * 2:
+                    batch = next(it, None)
+                    if batch is None: break
+                    running.add(pool.submit(self.process, batch))
+                if not running: break
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                for f in finished:
+                    done += f.result()
+                    if progress: progress(done, total)
+
+        complete = not self.cancelled.is_set() and done == total
+        self.checkpoint.close(complete)
+        return done, total
+
+    def process(self, batch):
+        try:
+            self.handler.process_images(batch, wait=False)
+        except Exception as e:
+            print(f"Backfill Error: {e}")
+        # Failures are checkpointed too: a resumed run shouldn't retry them forever.
+        self.checkpoint.mark(batch)
+        return len(batch)
+
+def main(argv=None):
+    config = load_app_config()
+    parser = argparse.ArgumentParser(description="Rename and sort screenshots that already exist in a folder.")
+    parser.add_argument("folder", nargs="?", default=config.get("track_folder"), help="folder to scan (default: track_folder)")
+    parser.add_argument("--workers", type=int, default=config.get("backfill_workers", 4))
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint of an interrupted run")
+    args = parser.parse_args(argv)
+
+    if config.get("labeler", "gemini") == "gemini" and not config.get("api_key"):
+        print("Please set api_key in app_config.json")
+        return 1
+    if not args.folder or not os.path.isdir(args.folder):
+        print(f"Folder not found: {args.folder}")
+        return 1
+    if args.restart and os.path.exists(BACKFILL_CHECKPOINT_FILE): os.remove(BACKFILL_CHECKPOINT_FILE)
+
+    metrics.METRICS.serve(config.get("metrics_port"))
+    history = HistoryLog()
+    catalog = Catalog()
+    recorder = Recorder(load_stats(), history, catalog)
+    folders = load_json(CONFIG_FILE)
+
+    def callback(type_, data):
+        if type_ == "success":
+            recorder.record(data, folder_description(folders, data.get("folder")))
+            print(f"{data['old']} -> {data['new']}")
+        elif type_ == "critical_error":
+            print(data)
+            job.cancel()
+
+    handler = ScreenshotHandler(callback, config, folders)
+    job = Backfill(handler, args.folder, history.iter_entries(), workers=args.workers,
+                   batch_size=config.get("analyze_batch_size", 4))
+    try:
+        done, total = job.run(progress=lambda d, t: print(f"[{d}/{t}]"))
+    except KeyboardInterrupt:
+        job.cancel()
+        done, total = 0, 0
+        print("Interrupted, run again to resume.")
+    handler.stop()
+    catalog.close()
+    print(f"Backfill finished: {done}/{total}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+"""Microbenchmarks for the hot paths.
+
+    python bench.py                  # everything, results in bench_results.json
+    python bench.py --quick          # smaller fixtures, for a fast sanity run
+    python bench.py --only extract_json sort_file
+    python bench.py --only startup_import   # import time of the GUI and the daemon core
+
+Fixtures are synthetic and seeded, so runs are comparable between versions.
+Each case is timed `repeat` times (after one warm-up) and reported as
+min/median/mean/p95 per operation plus ops/s; compare the medians.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import statistics
+import subprocess
+import tempfile
+import types
+from PIL import Image, ImageDraw
+
+RESULTS_FILE = "bench_results.json"
+BENCHMARKS = {}
+
+def benchmark(func):
+    BENCHMARKS[func.__name__] = func
+    return func
+
+def measure(run, ops=1, setup=None, repeat=5):
+    """Times run(state) `repeat` times; setup() (untimed) makes a fresh state for every run."""
+    times = []
+    for i in range(repeat + 1):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        run(state)
+        elapsed = time.perf_counter() - start
+        if i: times.append(elapsed / ops)  # first run is the warm-up
+    times.sort()
+    median = statistics.median(times)
+    return {"ops": ops, "repeat": repeat, "min_s": times[0], "median_s": median, "mean_s": statistics.mean(times),
+            "p95_s": times[min(len(times) - 1, int(len(times) * 0.95))], "ops_per_s": 1 / median if median else None}
+
+# --- FIXTURES ---
+WORDS = ("red", "sports", "car", "man", "portrait", "sunset", "code", "editor", "error", "dialog",
+         "chart", "revenue", "cat", "sleeping", "window", "settings", "menu", "receipt", "map", "invoice")
+
+def model_replies(rng, count):
+    def item(): return {"filename": "_".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))),
+                        "folder": rng.choice([None, "Cars", "People", "Work"])}
+    replies = []
+    for i in range(count):
+        kind = i % 5
+        if kind == 0: replies.append(json.dumps(item()))
+        elif kind == 1: replies.append("```json\n" + json.dumps(item(), indent=2) + "\n```")
+        elif kind == 2: replies.append("Here is the result:\n" + json.dumps(item()) + "\nLet me know if you need anything else.")
+        elif kind == 3: replies.append("```json\n" + json.dumps([item() for _ in range(8)], indent=2) + "\n```")
+        else: replies.append("I'm sorry, I can't determine a good filename for this image.")
+    return replies
+
+def history_entries(rng, count):
+    now = time.time()
+    return [{"path": f"C:\\Users\\user\\Pictures\\Screenshots\\shot_{i}.png", "old": f"Screenshot {i}.png",
+             "new": "_".join(rng.choice(WORDS) for _ in range(3)) + ".png", "folder": rng.choice([None, "Cars", "Work"]),
+             "content_hash": "%064x" % rng.getrandbits(256), "size": rng.randint(50_000, 5_000_000),
+             "created_at": now - i, "processed_at": now - i + 3, "model": "gemini-2.5-flash"} for i in range(count)]
+
+def screenshot(path, size, rng):
+    # Flat UI-like blocks and text lines: compresses and decodes like a real screenshot.
+    img = Image.new("RGB", size, (30, 30, 30))
+    draw = ImageDraw.Draw(img)
+    for _ in range(60):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        draw.rectangle([x, y, x + rng.randint(50, 800), y + rng.randint(20, 400)],
+                       fill=tuple(rng.randrange(256) for _ in range(3)))
+    for y in range(0, size[1], 24):
+        draw.text((rng.randint(0, 200), y), " ".join(rng.choice(WORDS) for _ in range(12)), fill=(220, 220, 220))
+    img.save(path)
+
+def make_files(directory, names, size, rng):
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for name in names:
+        p = os.path.join(directory, name)
+        with open(p, 'wb') as f: f.write(rng.randbytes(size) if size else b"")
+        paths.append(p)
+    return paths
+
+def handler_stub(**attrs):
+    # rename_file/sort_file only touch these attributes; building a real handler
+    # would start the pipeline threads.
+    return types.SimpleNamespace(**attrs)
+
+# --- BENCHMARKS ---
+@benchmark
+def extract_json(ctx):
+    from labelers import extract_json, extract_json_array
+    replies = model_replies(random.Random(1), 500)
+    arrays = [r for r in replies if r.lstrip("`json\n").startswith("[")]
+    return {
+        "object_mixed_replies": measure(lambda _: [extract_json(r) for r in replies], ops=len(replies), repeat=ctx.repeat),
+        "array_batch_of_8": measure(lambda _: [extract_json_array(r) for r in arrays], ops=len(arrays), repeat=ctx.repeat),
+    }
+
+@benchmark
+def rename_file(ctx):
+    from core import ScreenshotHandler
+    from name_allocator import NameAllocator
+    existing, renames = (500, 100) if ctx.quick else (5000, 500)
+    rng = random.Random(2)
+    directory = os.path.join(ctx.tmp, "rename")
+    make_files(directory, ["man_portrait.png"] + [f"man_portrait_{i}.png" for i in range(1, existing)], 0, rng)
+
+    def setup():
+        # Drop the previous run's renames so every run sees the same collisions.
+        for name in os.listdir(directory):
+            if name.startswith("man_portrait_") and int(name[13:-4]) >= existing: os.remove(os.path.join(directory, name))
+        srcs = make_files(directory, [f"Screenshot {i}.png" for i in range(renames)], 0, rng)
+        return srcs, handler_stub(names=NameAllocator())
+    def run(state):
+        srcs, handler = state
+        for p in srcs: ScreenshotHandler.rename_file(handler, p, "man portrait")
+    return {f"{existing}_collisions": measure(run, ops=renames, setup=setup, repeat=ctx.repeat)}
+
+@benchmark
+def sort_file(ctx):
+    from core import ScreenshotHandler
+    from sorting import Sorter, SORT_MODES
+    from result_cache import file_hash
+    count, size = (20, 1 << 20) if ctx.quick else (100, 2 << 20)
+    rng = random.Random(3)
+    results = {}
+    for mode in SORT_MODES:
+        base = os.path.join(ctx.tmp, "sort", mode)
+        def setup():
+            shutil.rmtree(base, ignore_errors=True)
+            srcs = make_files(base, [f"shot_{i}.png" for i in range(count)], size, rng)
+            hashes = [file_hash(p) for p in srcs]
+            handler = handler_stub(config={"dest_folder": base}, sorter=Sorter(mode), folder_stats=None)
+            return srcs, hashes, handler
+        def run(state):
+            srcs, hashes, handler = state
+            for p, h in zip(srcs, hashes): ScreenshotHandler.sort_file(handler, p, "Sorted", h)
+        r = results[f"{mode}_{size >> 20}MB"] = measure(run, ops=count, setup=setup, repeat=ctx.repeat)
+        r["mb_per_s"] = (size / (1 << 20)) / r["median_s"] if r["median_s"] else None
+
+    # Identical content already in the folder: the dedup check should skip the write.
+    base = os.path.join(ctx.tmp, "sort", "duplicate")
+    def setup_dup():
+        shutil.rmtree(base, ignore_errors=True)
+        srcs = make_files(base, [f"shot_{i}.png" for i in range(count)], size, rng)
+        os.makedirs(os.path.join(base, "Sorted"))
+        for p in srcs: shutil.copy2(p, os.path.join(base, "Sorted", "old_" + os.path.basename(p)))
+        handler = handler_stub(config={"dest_folder": base}, sorter=Sorter("copy"), folder_stats=None)
+        return srcs, [file_hash(p) for p in srcs], handler
+    def run_dup(state):
+        srcs, hashes, handler = state
+        for p, h in zip(srcs, hashes): ScreenshotHandler.sort_file(handler, p, "Sorted", h)
+    results["duplicate_skip"] = measure(run_dup, ops=count, setup=setup_dup, repeat=ctx.repeat)
+    return results
+
+@benchmark
+def get_folder_stats(ctx):
+    from core import get_folder_stats
+    dirs, per_dir = (20, 100) if ctx.quick else (100, 200)
+    rng = random.Random(4)
+    root = os.path.join(ctx.tmp, "tree")
+    for d in range(dirs):
+        make_files(os.path.join(root, f"d{d % 10}", f"sub{d}"), [f"f{i}.png" for i in range(per_dir)], 0, rng)
+    return {f"{dirs * per_dir}_files": measure(lambda _: get_folder_stats(root), repeat=ctx.repeat)}
+
+@benchmark
+def load_save_json(ctx):
+    from core import load_json, save_json
+    count = 5000 if ctx.quick else 50000
+    path = os.path.join(ctx.tmp, "history.json")
+    entries = history_entries(random.Random(5), count)
+    save_json(path, entries)
+    return {
+        f"load_{count}": measure(lambda _: load_json(path), repeat=ctx.repeat),
+        f"save_{count}": measure(lambda _: save_json(path, entries), repeat=ctx.repeat),
+    }
+
+@benchmark
+def thumbnail_decode(ctx):
+    from thumbnails import ThumbnailCache
+    count = 3 if ctx.quick else 10
+    rng = random.Random(6)
+    directory = os.path.join(ctx.tmp, "shots")
+    os.makedirs(directory, exist_ok=True)
+    srcs = [os.path.join(directory, f"shot_{i}.png") for i in range(count)]
+    for p in srcs: screenshot(p, (3840, 2160), rng)
+
+    def original(_):
+        # What the gallery did before the thumbnail cache: full decode, then resize.
+        for p in srcs:
+            with Image.open(p) as img:
+                img.load()
+                img.thumbnail((500, 500))
+    def cold_setup():
+        shutil.rmtree(os.path.join(ctx.tmp, "thumbs"), ignore_errors=True)
+        return ThumbnailCache(os.path.join(ctx.tmp, "thumbs"))
+    def cold(cache):
+        for p in srcs: cache.ensure(p)
+    warm_cache = cold_setup()
+    cold(warm_cache)
+    def warm(_):
+        for p in srcs: warm_cache.load(p)
+    return {
+        "original_4k_decode": measure(original, ops=count, repeat=ctx.repeat),
+        "cache_cold_generate": measure(cold, ops=count, setup=cold_setup, repeat=ctx.repeat),
+        "cache_warm_load": measure(warm, ops=count, repeat=ctx.repeat),
+    }
+
+@benchmark
+def startup_import(ctx):
+    # A fresh interpreter per run, so nothing is already imported; compare with
+    # the bare interpreter to see what the modules themselves cost.
+    here = os.path.dirname(os.path.abspath(__file__))
+    def python(code):
+        return lambda _: subprocess.run([sys.executable, "-c", code], cwd=here, check=True)
+    return {
+        "python_baseline": measure(python("pass"), repeat=ctx.repeat),
+        "import_core": measure(python("import core"), repeat=ctx.repeat),
+        "import_gui_app": measure(python("import gui_app"), repeat=ctx.repeat),
+    }
+
+# --- RUNNER ---
+def version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except Exception: return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Microbenchmarks for the hot paths.")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--quick", action="store_true", help="smaller fixtures")
+    parser.add_argument("--output", default=RESULTS_FILE)
+    args = parser.parse_args(argv)
+
+    report = {"version": version(), "timestamp": time.time(), "python": platform.python_version(),
+              "platform": platform.platform(), "quick": args.quick, "repeat": args.repeat, "results": {}}
+    with tempfile.TemporaryDirectory(prefix="bench_") as tmp:
+        ctx = types.SimpleNamespace(tmp=tmp, quick=args.quick, repeat=args.repeat)
+        for name in args.only or BENCHMARKS:
+            print(f"{name}...", flush=True)
+            try:
+                report["results"][name] = BENCHMARKS[name](ctx)
+            except Exception as e:
+                print(f"  failed: {e}")
+                report["results"][name] = {"error": str(e)}
+                continue
+            for case, r in report["results"][name].items():
+                print(f"  {case:<28} median {r['median_s'] * 1000:10.3f} ms/op   p95 {r['p95_s'] * 1000:10.3f} ms/op")
+
+    with open(args.output, 'w') as f: json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
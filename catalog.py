@@ -0,0 +1,104 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+
+CATALOG_FILE = "catalog.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    old_name TEXT,
+    new_name TEXT,
+    folder TEXT,
+    folder_description TEXT,
+    content_hash TEXT,
+    size INTEGER,
+    created_at REAL,
+    processed_at REAL,
+    model TEXT
+);
+CREATE INDEX IF NOT EXISTS files_path ON files(path);
+CREATE INDEX IF NOT EXISTS files_folder ON files(folder);
+CREATE INDEX IF NOT EXISTS files_hash ON files(content_hash);
+CREATE INDEX IF NOT EXISTS files_processed ON files(processed_at);
+
+-- '_' is a separator for unicode61, so 'red_sports_car' indexes as three words.
+CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
+    new_name, folder, folder_description, content='files', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS files_ai AFTER INSERT ON files BEGIN
+    INSERT INTO files_fts(rowid, new_name, folder, folder_description)
+    VALUES (new.id, new.new_name, new.folder, new.folder_description);
+END;
+CREATE TRIGGER IF NOT EXISTS files_ad AFTER DELETE ON files BEGIN
+    INSERT INTO files_fts(files_fts, rowid, new_name, folder, folder_description)
+    VALUES ('delete', old.id, old.new_name, old.folder, old.folder_description);
+END;
+"""
+
+COLUMNS = ("path", "old_name", "new_name", "folder", "folder_description", "content_hash",
+           "size", "created_at", "processed_at", "model")
+
+class Catalog:
+    """SQLite index of processed files with full-text search over names and folders."""
+
+    def __init__(self, path=CATALOG_FILE):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def row(self, entry, folder_description=None):
+        path = entry.get("path", "")
+        return (path, entry.get("old"), entry.get("new") or os.path.basename(path), entry.get("folder"),
+                folder_description, entry.get("content_hash"), entry.get("size"), entry.get("created_at"),
+                entry.get("processed_at") or time.time(), entry.get("model"))
+
+    def add(self, entry, folder_description=None):
+        with self.lock, self.db:
+            self.db.execute(f"INSERT INTO files ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                            self.row(entry, folder_description))
+
+    def import_entries(self, entries, descriptions=None):
+        """Bulk load (e.g. the existing history) in one transaction."""
+        descriptions = descriptions or {}
+        rows = [self.row(e, descriptions.get(e.get("folder"))) for e in entries]
+        with self.lock, self.db:
+            self.db.executemany(f"INSERT INTO files ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", rows)
+        return len(rows)
+
+    def match_query(self, text):
+        words = re.findall(r"\w+", text.lower())
+        return " ".join(f'"{w}"*' for w in words)
+
+    def count(self, text=None):
+        query = self.match_query(text) if text else None
+        with self.lock:
+            if query:
+                return self.db.execute("SELECT COUNT(*) FROM files_fts WHERE files_fts MATCH ?", (query,)).fetchone()[0]
+            return self.db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def recent(self, limit=50, offset=0):
+        with self.lock:
+            rows = self.db.execute("SELECT * FROM files ORDER BY id DESC LIMIT ? OFFSET ?", (limit, offset)).fetchall()
+        return [dict(r) for r in rows]
+
+    def search(self, text, limit=50, offset=0):
+        """Newest matches first. Every word must match (as a prefix) a name, folder or folder description."""
+        query = self.match_query(text)
+        if not query: return self.recent(limit, offset)
+        with self.lock:
+            # FTS5 walks its own rowid order, so the LIMIT is applied before any sort.
+            rows = self.db.execute(
+                "SELECT * FROM files WHERE id IN "
+                "(SELECT rowid FROM files_fts WHERE files_fts MATCH ? ORDER BY rowid DESC LIMIT ? OFFSET ?) "
+                "ORDER BY id DESC", (query, limit, offset)).fetchall()
+        return [dict(r) for r in rows]
+
+    def close(self):
+        with self.lock: self.db.close()
@@ -0,0 +1,63 @@
+import os
+import json
+import threading
+
+APP_CONFIG_FILE = "app_config.json"
+
+# One client per process. genai.Client is safe to share between threads and its
+# httpx pool keeps connections alive, so every worker after the first skips the
+# client setup and TLS handshake.
+# google.genai and httpx take most of a second to import, so they're only
+# loaded when the first client (or image part) is needed, not at app start.
+MAX_CONNECTIONS = 32
+KEEPALIVE_EXPIRY = 120
+
+_lock = threading.Lock()
+_client = None
+_client_key = None
+
+def configured_api_key():
+    if os.path.exists(APP_CONFIG_FILE):
+        try:
+            with open(APP_CONFIG_FILE, 'r') as f:
+                key = json.load(f).get("api_key")
+            if key: return key
+        except: pass
+    return os.environ.get("GOOGLE_API_KEY", "")
+
+def _build(api_key):
+    import httpx
+    from google import genai
+    from google.genai import types
+    limits = httpx.Limits(max_connections=MAX_CONNECTIONS,
+                          max_keepalive_connections=MAX_CONNECTIONS,
+                          keepalive_expiry=KEEPALIVE_EXPIRY)
+    http_options = types.HttpOptions(client_args={"limits": limits},
+                                     async_client_args={"limits": limits})
+    return genai.Client(api_key=api_key, http_options=http_options)
+
+def get_client(api_key=None):
+    """Shared client for api_key (default: the one in app_config.json).
+    Rebuilt only when the key changes."""
+    global _client, _client_key
+    if api_key is None: api_key = configured_api_key()
+    with _lock:
+        if _client is None or api_key != _client_key:
+            # The old client may still be mid-request on another worker;
+            # leave it to be collected instead of closing it under them.
+            _client = _build(api_key)
+            _client_key = api_key
+        return _client
+
+def image_part(data, mime_type):
+    from google.genai import types
+    return types.Part.from_bytes(data=data, mime_type=mime_type)
+
+def reset():
+    global _client, _client_key
+    with _lock:
+        if _client is not None:
+            try: _client.close()
+            except: pass
+        _client = None
+        _client_key = None
@@ -0,0 +1,511 @@
+import os
+import time
+import json
+import asyncio
+import threading
+import traceback
+from collections import OrderedDict
+from watchdog.events import FileSystemEventHandler
+from PIL import Image
+from pipeline import StagedPipeline
+import rate_limit
+import metrics
+from labelers import make_labeler, Cancelled
+from async_engine import AsyncEngine
+from readiness import ReadinessTracker, wait_until_ready
+from folder_stats import scan_folder
+from name_allocator import get_allocator
+from sorting import Sorter, DEFAULT_SORT_MODE
+from result_cache import get_cache, file_hash, folders_signature
+from phash_index import get_index, image_signature
+from journal import get_journal
+
+# Processing core shared by the GUI (gui_app.py), the headless daemon
+# (daemon.py) and backfill.py. Nothing here may import customtkinter,
+# pystray or tkinter.
+
+CONFIG_FILE = "smart_folders.json"
+HISTORY_FILE = "history.json"
+STATS_FILE = "stats.json"
+APP_CONFIG_FILE = "app_config.json"
+
+# --- HELPERS ---
+def load_json(file_path):
+    if os.path.exists(file_path):
+        try:
+            with open(file_path, 'r') as f: return json.load(f)
+        except: return []
+    return []
+
+def save_json(file_path, data):
+    with open(file_path, 'w') as f: json.dump(data, f, indent=4)
+
+def load_stats():
+    if os.path.exists(STATS_FILE):
+        try:
+            with open(STATS_FILE, 'r') as f: return json.load(f)
+        except: pass
+    return {"total_count": 0, "is_pro": False}
+
+def save_stats(stats):
+    with open(STATS_FILE, 'w') as f: json.dump(stats, f, indent=4)
+
+def load_app_config():
+    default = {"api_key": "", "model": "gemini-2.5-flash", "track_folder": "", "dest_folder": "",
+               "ingest_workers": 2, "analyze_workers": 4, "commit_workers": 1, "stage_queue_size": 32,
+               "upload_max_side": 1568, "upload_format": "JPEG", "upload_quality": 80,
+               "result_cache_size": 5000, "near_duplicate_distance": -1,
+               "near_duplicate_index_size": 5000, "analyze_batch_size": 4, "analyze_batch_wait": 0.3,
+               "analysis_engine": "threads", "max_in_flight": 64, "request_timeout": 60,
+               "ready_poll_interval": 0.05, "ready_timeout": 60,
+               "backfill_workers": 4, "thumbnail_cache_mb": 200, "sort_mode": "reflink",
+               "rate_limit_rpm": 10, "rate_limit_tpm": 250000, "max_retries": 5, "metrics_port": 9464,
+               "labeler": "gemini", "fake_labeler": {"latency_ms": 800, "per_image_ms": 50, "jitter": 0.3,
+                                                     "errors": {"429": 0.02, "503": 0.01, "bad_json": 0.01}}}
+    if os.path.exists(APP_CONFIG_FILE):
+        try:
+            with open(APP_CONFIG_FILE, 'r') as f:
+                data = json.load(f)
+                default.update(data)
+                default["model"] = "gemini-2.5-flash"
+        except: pass
+    return default
+
+def save_app_config(config):
+    config["model"] = "gemini-2.5-flash"
+    with open(APP_CONFIG_FILE, 'w') as f: json.dump(config, f, indent=4)
+
+def folder_description(folders, name):
+    for f in folders:
+        if f['name'] == name: return f.get('description')
+    return None
+
+def import_history(catalog, history, folders):
+    # One-time: entries recorded before the catalog existed.
+    descriptions = {f['name']: f.get('description') for f in folders}
+    count = catalog.import_entries(history.iter_entries(), descriptions)
+    print(f"Imported {count} history entries into the catalog")
+
+class Recorder:
+    """Bookkeeping for a successfully processed file: stats counter, history, catalog."""
+
+    def __init__(self, stats, history, catalog=None):
+        self.stats = stats
+        self.history = history
+        self.catalog = catalog
+        self.lock = threading.Lock()
+
+    def record(self, data, folder_description=None):
+        with self.lock:
+            self.stats["total_count"] = self.stats.get("total_count", 0) + 1
+            save_stats(self.stats)
+        self.history.append(data)
+        if self.catalog is not None:
+            try: self.catalog.add(data, folder_description)
+            except Exception as e: print(f"Catalog Error: {e}")
+
+# --- LOGIC ---
+def safe_label(label):
+    return "".join([c for c in label if c.isalnum() or c in (' ', '-', '_')]).strip().replace(' ', '_')[:50]
+
+class ScreenshotHandler(FileSystemEventHandler):
+    def __init__(self, app_callback, config, folders, folder_stats=None):
+        self.app_callback = app_callback
+        self.config = config
+        self.folders = folders
+        self.folder_stats = folder_stats
+        self.names = get_allocator()
+        self.sorter = Sorter(config.get("sort_mode", DEFAULT_SORT_MODE))
+        # The limiter is shared with every other handler in the process (watcher and backfill).
+        self.labeler = make_labeler(config, folders,
+                                    rate_limit.get_limiter(config.get("rate_limit_rpm", rate_limit.DEFAULT_RPM),
+                                                           config.get("rate_limit_tpm", rate_limit.DEFAULT_TPM),
+                                                           config.get("max_retries", rate_limit.DEFAULT_MAX_RETRIES)),
+                                    config.get("request_timeout", 60))
+        # STOP without drain: queued files are left in the journal instead of being sent.
+        self.cancelled = threading.Event()
+        self.labeler.cancelled = self.cancelled
+        self.cache = get_cache(config.get("result_cache_size", 5000))
+        # Off by default (-1): reusing a label for a different image is worse than paying for a request.
+        distance = config.get("near_duplicate_distance", -1)
+        self.phash_index = (get_index(distance, config.get("near_duplicate_index_size", 5000))
+                            if distance is not None and distance >= 0 else None)
+
+        # ingest (wait + verify) -> analyze (API) -> commit (rename + sort).
+        # Each stage has its own pool so a slow disk never holds up API workers,
+        # and the bounded queues push back on bursts instead of spawning threads.
+        queue_size = config.get("stage_queue_size", 32)
+        batch_size = config.get("analyze_batch_size", 4)
+        batch_wait = config.get("analyze_batch_wait", 0.3)
+        self.pipeline = StagedPipeline()
+        self.pipeline.add_stage("ingest", self.ingest, config.get("ingest_workers", 2), queue_size)
+        self.engine = None
+        if config.get("analysis_engine") == "async":
+            # Requests run as coroutines on one event loop; the stage thread only dispatches.
+            self.engine = AsyncEngine(config.get("max_in_flight", 64))
+            self.engine.start()
+            self.pipeline.add_async_stage("analyze", self.analyze_batch_async, self.engine, 1, queue_size,
+                                          batch_size=batch_size, batch_wait=batch_wait)
+        else:
+            self.pipeline.add_stage("analyze", self.analyze_batch, config.get("analyze_workers", 4), queue_size,
+                                    batch_size=batch_size, batch_wait=batch_wait)
+        self.pipeline.add_stage("commit", self.commit, config.get("commit_workers", 1), queue_size)
+        self.pipeline.start()
+
+        # Files enter the pipeline as soon as they're completely written.
+        self.verify_failures = {}
+        self.detected = OrderedDict()  # path -> when its first event came in, for the wait/total timings
+        self.journal = get_journal()
+        self.readiness = ReadinessTracker(self.pipeline.submit,
+                                          min_interval=config.get("ready_poll_interval", 0.05),
+                                          timeout=config.get("ready_timeout", 60),
+                                          on_drop=self.journal.fail)
+        # Leftover jobs are claimed now but fed in the background: there may be hundreds,
+        # and the pipeline takes them at its own pace (the GUI builds handlers on the Tk thread).
+        self.stopping = threading.Event()
+        self.resumer = threading.Thread(target=self.resume, args=(self.journal.claim(self),), name="resume", daemon=True)
+        self.resumer.start()
+
+    def is_image(self, path):
+        return os.path.splitext(path)[1].lower() in ['.png', '.jpg', '.jpeg']
+
+    def on_created(self, event):
+        if event.is_directory: return
+        filename = event.src_path
+        if self.names.ours(filename): return  # our own rename
+        self.names.added(filename)
+        if self.is_image(filename):
+            if not self.journal.begin(filename, self, old=os.path.basename(filename)):
+                return  # already in flight (a repeated event, or backfill has it)
+            self.app_callback("detect", filename)
+            metrics.inc("detected")
+            try: metrics.observe("detect", time.time() - os.path.getmtime(filename))  # write -> event lag
+            except OSError: pass
+            self.detected[filename] = time.monotonic()
+            while len(self.detected) > 10000: self.detected.popitem(last=False)
+            self.readiness.touch(filename)
+
+    def on_modified(self, event):
+        if not event.is_directory and self.is_image(event.src_path):
+            self.readiness.touch(event.src_path, create=False)
+
+    def on_closed(self, event):
+        if not event.is_directory and self.is_image(event.src_path):
+            self.readiness.closed(event.src_path)
+
+    def on_deleted(self, event):
+        if not event.is_directory: self.names.removed(event.src_path)
+
+    def on_moved(self, event):
+        if event.is_directory: return
+        self.names.removed(event.src_path)
+        self.names.added(event.dest_path)
+
+    def stop(self, drain=False):
+        """drain=False cancels requests in flight (async engine) and skips whatever is
+        still queued for analysis (both engines); those files stay in the journal
+        and are picked up on the next start. Files already analyzed are still
+        renamed and sorted. drain=True lets every file already detected finish
+        (daemon shutdown)."""
+        if not drain: self.cancelled.set()
+        self.stopping.set()
+        self.resumer.join()  # jobs it hasn't fed yet stay claimed until release() below
+        self.readiness.stop(drain)
+        if self.engine and not drain: self.engine.stop()
+        self.pipeline.stop()
+        if self.engine: self.engine.stop()
+        self.cache.flush()
+        # Whatever didn't finish stays in the journal for the next handler (or run).
+        self.journal.release(self)
+
+    def resume(self, jobs):
+        """Jobs a previous run (or a stopped handler) left unfinished, each from its
+        last completed step: detected ones are analyzed again (a cached answer is
+        reused), later ones go straight to the commit stage without an API call."""
+        for job in jobs:
+            if self.stopping.is_set(): return
+            path, state = job["path"], job["state"]
+            if state == "analyzed" and not self.same_file(path, job.get("hash")):
+                # Killed between the rename and its journal line: find the renamed file.
+                found = self.find_renamed(path, job)
+                if found: self.journal.advance(path, "renamed", path=found, name=os.path.basename(found))
+                path = found
+            if not path or not os.path.exists(path):
+                print(f"Dropping unfinished job, file is gone: {job['path']}")
+                self.journal.fail(job["path"])
+                continue
+            print(f"Resuming {os.path.basename(path)} after '{state}'")
+            if state == "detected": self.feed(path)
+            else: self.feed((path, dict(job["result"], content_hash=job.get("hash"))), stage="commit")
+
+    def feed(self, item, stage=None):
+        # Waits for room like submit(), but gives up once stop() has begun.
+        while not self.stopping.is_set():
+            if self.pipeline.submit(item, timeout=0.2, stage=stage): return
+
+    def same_file(self, path, content_hash):
+        try: return file_hash(path) == content_hash
+        except OSError: return False
+
+    def find_renamed(self, path, job):
+        directory, ext = os.path.dirname(path), os.path.splitext(path)[1]
+        label = safe_label(job["result"].get("filename") or "")
+        try: names = os.listdir(directory)
+        except OSError: return None
+        for name in names:
+            stem, e = os.path.splitext(name)
+            if e != ext or not (stem == label or stem.startswith(label + "_")): continue
+            candidate = os.path.join(directory, name)
+            if not self.journal.get(candidate) and self.same_file(candidate, job.get("hash")): return candidate
+        return None
+
+    def process_image(self, file_path):
+        return self.process_images([file_path])[0]
+
+    def process_images(self, file_paths, wait=True):
+        """Same stages, run inline on the calling thread. Returns the new path (or None) per file."""
+        ok = []
+        for file_path in file_paths:
+            if not self.journal.begin(file_path, self, old=os.path.basename(file_path)): continue  # in flight
+            if wait:
+                with metrics.timer("wait"):
+                    if not wait_until_ready(file_path):
+                        metrics.inc("files_failed")
+                        self.journal.fail(file_path)
+                        continue
+            try:
+                self.verify(file_path)
+                ok.append(file_path)
+            except Exception as e:
+                metrics.inc("files_failed")
+                self.journal.fail(file_path)
+                print(f"Verify Error: {e}")
+        done = {}
+        for item in self.analyze_batch(ok) if ok else []:
+            if item: done[item[0]] = self.commit(item)
+        return [done.get(p) for p in file_paths]
+
+    def verify(self, file_path):
+        with metrics.timer("verify"), Image.open(file_path) as img:
+            img.verify()
+
+    def ingest(self, file_path):
+        started = self.detected.get(file_path)
+        if started is not None and file_path not in self.verify_failures:
+            metrics.observe("wait", time.monotonic() - started)
+        try:
+            self.verify(file_path)
+            self.verify_failures.pop(file_path, None)
+            return file_path
+        except Exception as e:
+            # Stable on disk but not a complete image yet (some tools write in
+            # bursts) - watch it a bit longer.
+            failures = self.verify_failures.get(file_path, 0) + 1
+            if failures < 5 and os.path.exists(file_path):
+                self.verify_failures[file_path] = failures
+                metrics.inc("verify_retries")
+                self.readiness.touch(file_path, force=True)
+            else:
+                self.verify_failures.pop(file_path, None)
+                self.detected.pop(file_path, None)
+                metrics.inc("files_failed")
+                self.journal.fail(file_path)
+                print(f"Verify Error: {e}")
+            return None
+
+    def analyze(self, file_path):
+        return self.analyze_batch([file_path])[0]
+
+    def lookup(self, file_path):
+        # Local answers first: exact content cache, then near-duplicates.
+        content_hash = file_hash(file_path)
+        job = {"path": file_path, "hash": content_hash, "key": self.cache.key(content_hash, self.labeler.model, self.folders),
+               "phash": None, "thumb": None, "signature": None}
+        result = self.cache.get(job["key"])
+        if result:
+            print(f"Cache hit for {os.path.basename(file_path)} {self.cache.stats()}")
+            metrics.inc("cache_hits")
+            return job, result
+
+        if self.phash_index is not None:
+            (job["phash"], job["thumb"]), job["signature"] = image_signature(file_path), folders_signature(self.folders)
+            match = self.phash_index.find(job["phash"], job["thumb"], job["signature"])
+            if match:
+                print(f"Near-duplicate of '{match['filename']}' for {os.path.basename(file_path)}")
+                metrics.inc("near_duplicate_hits")
+                return job, {"filename": match["filename"], "folder": match["folder"]}
+        return job, None
+
+    def lookup_batch(self, file_paths):
+        out = [None] * len(file_paths)
+        pending = []
+        for i, file_path in enumerate(file_paths):
+            try:
+                job, result = self.lookup(file_path)
+            except Exception as e:
+                print(f"Error: {e}")
+                continue
+            if result: out[i] = (file_path, dict(result, content_hash=job["hash"]))
+            else: pending.append((i, job))
+        return out, pending
+
+    def store_results(self, out, pending, results):
+        for (i, job), result in zip(pending, results):
+            if result and result.get("filename"):
+                self.cache.put(job["key"], result)
+                if job["phash"] is not None:
+                    self.phash_index.add(job["phash"], job["thumb"], result.get("filename"), result.get("folder"),
+                                         job["signature"])
+                out[i] = (job["path"], dict(result, content_hash=job["hash"]))
+        return out
+
+    def analyze_batch(self, file_paths):
+        if self.cancelled.is_set(): return self.skip(file_paths)
+        out, pending = self.lookup_batch(file_paths)
+        if pending:
+            try:
+                results = self.analyze_images([job["path"] for _, job in pending])
+                out = self.store_results(out, pending, results)
+            except Exception as e:
+                self.report_error(e)
+        if self.cancelled.is_set(): return self.skip(file_paths)
+        return self.count_failures(file_paths, out)
+
+    def skip(self, file_paths):
+        # Not failed: the journal keeps them (answers already received are in the cache).
+        for file_path in file_paths: self.detected.pop(file_path, None)
+        return [None] * len(file_paths)
+
+    async def analyze_batch_async(self, file_paths):
+        if self.cancelled.is_set(): return self.skip(file_paths)
+        out, pending = await asyncio.to_thread(self.lookup_batch, file_paths)
+        if pending:
+            try:
+                results = await self.analyze_images_async([job["path"] for _, job in pending])
+                out = await asyncio.to_thread(self.store_results, out, pending, results)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.report_error(e)
+        return await asyncio.to_thread(self.count_failures, file_paths, out)
+
+    def count_failures(self, file_paths, out):
+        for file_path, item in zip(file_paths, out):
+            if item is None:
+                metrics.inc("files_failed")
+                self.detected.pop(file_path, None)
+                self.journal.fail(file_path)
+            else:
+                result = item[1]
+                self.journal.advance(file_path, "analyzed", hash=result.get("content_hash"),
+                                     result={"filename": result.get("filename"), "folder": result.get("folder")})
+        return out
+
+    def report_error(self, e):
+        msg = str(e).lower()
+        if "403" in msg or "leaked" in msg or "permission_denied" in msg:
+            self.app_callback("critical_error", "Your API Key is invalid or leaked.\nPlease update it in Settings.")
+        else:
+            print(f"Error: {e}")
+            traceback.print_exc()
+
+    def commit(self, item):
+        file_path, result = item
+        new_name = result.get("filename")
+        folder_match = result.get("folder")
+        # Steps a resumed job already did are skipped.
+        job = self.journal.get(file_path) or {}
+        state = job.get("state")
+
+        old_name = job.get("old") or os.path.basename(file_path)
+        try: st = os.stat(file_path)
+        except OSError: st = None
+        if state in ("renamed", "sorted"):
+            new_path = file_path
+        else:
+            with metrics.timer("rename"):
+                new_path = self.rename_file(file_path, new_name)
+            if new_path: self.journal.advance(file_path, "renamed", path=new_path, name=os.path.basename(new_path))
+        started = self.detected.pop(file_path, None)
+
+        if new_path:
+            final_name = job.get("name") if state == "sorted" else os.path.basename(new_path)
+            if folder_match and state != "sorted":
+                with metrics.timer("sort"):
+                    sorted_path = self.sort_file(new_path, folder_match, result.get("content_hash"))
+                renamed_path = new_path
+                if sorted_path and self.sorter.mode == "move": new_path = sorted_path
+                self.journal.advance(renamed_path, "sorted", path=new_path)
+            metrics.inc("files_succeeded")
+            if started is not None: metrics.observe("total", time.monotonic() - started)
+            self.app_callback("success", {"path": new_path, "old": old_name, "new": final_name,
+                                          "folder": folder_match, "content_hash": result.get("content_hash"),
+                                          "size": st.st_size if st else None, "created_at": st.st_mtime if st else None,
+                                          "processed_at": time.time(), "model": self.labeler.model})
+            self.journal.finish(new_path)
+        else:
+            metrics.inc("files_failed")
+            self.journal.fail(file_path)
+        return new_path
+
+    def request_failed(self, e):
+        metrics.inc("request_errors")
+        print(f"Analyze Error: {e}")
+        traceback.print_exc()
+        msg = str(e).lower()
+        if "403" in msg or "leaked" in msg or "permission_denied" in msg:
+            raise e
+
+    def analyze_image(self, file_path):
+        return self.analyze_images([file_path])[0]
+
+    def analyze_images(self, file_paths):
+        try:
+            return self.labeler.analyze(file_paths)
+        except Cancelled:
+            pass
+        except Exception as e:
+            self.request_failed(e)
+        return [None] * len(file_paths)
+
+    async def analyze_images_async(self, file_paths):
+        try:
+            return await self.labeler.analyze_async(file_paths)
+        except asyncio.CancelledError:
+            raise
+        except Cancelled:
+            pass
+        except asyncio.TimeoutError:
+            print(f"Analyze Timeout after {self.labeler.timeout}s: {', '.join(os.path.basename(p) for p in file_paths)}")
+        except Exception as e:
+            self.request_failed(e)
+        return [None] * len(file_paths)
+
+    def rename_file(self, file_path, label):
+        try: return self.names.rename(file_path, safe_label(label))
+        except: return None
+
+    def sort_file(self, file_path, folder_name, content_hash=None):
+        """Returns where the file ended up in the smart folder, or None."""
+        try:
+            dest_base = self.config.get("dest_folder")
+            if not dest_base or not os.path.exists(dest_base):
+                dest_base = self.config.get("track_folder")
+                if not dest_base: return None
+            
+            target_dir = os.path.join(dest_base, folder_name)
+            target_path, how = self.sorter.sort(file_path, target_dir, content_hash)
+            print(f"Sorted ({how}) to {target_path}")
+            if self.folder_stats and how != "duplicate": self.folder_stats.file_added(target_dir, target_path)
+            return target_path
+        except Exception as e:
+            print(f"Sort Error: {e}")
+            traceback.print_exc()
+            return None
+
+def get_folder_stats(folder_path):
+    # Full scan; the Folders page reads FolderStats' cached totals instead.
+    if not os.path.exists(folder_path):
+        return 0, 0
+    files = scan_folder(folder_path)
+    return sum(files.values()), len(files)
@@ -0,0 +1,81 @@
+"""Headless renamer: watches track_folder and renames/sorts new screenshots with
+the same core, app_config.json and smart_folders.json as the GUI.
+
+    python daemon.py                 # watch track_folder from app_config.json
+    python daemon.py --folder D:\\Shots
+
+SIGTERM or Ctrl+C stops watching and lets every file already detected finish;
+a second signal exits right away. Files it didn't get to (or a crash) are
+picked up from jobs.jsonl on the next start.
+"""
+import os
+import sys
+import signal
+import argparse
+import threading
+from watchdog.observers import Observer
+from core import (ScreenshotHandler, Recorder, folder_description, import_history, load_json, load_stats,
+                  load_app_config, CONFIG_FILE, HISTORY_FILE)
+from history_log import HistoryLog
+from catalog import Catalog
+import metrics
+
+def main(argv=None):
+    config = load_app_config()
+    parser = argparse.ArgumentParser(description="Rename and sort new screenshots without the GUI.")
+    parser.add_argument("--folder", default=config.get("track_folder"), help="folder to watch (default: track_folder)")
+    args = parser.parse_args(argv)
+
+    if config.get("labeler", "gemini") == "gemini" and not config.get("api_key"):
+        print("Please set api_key in app_config.json")
+        return 1
+    if not args.folder or not os.path.isdir(args.folder):
+        print(f"Folder not found: {args.folder}")
+        return 1
+    config["track_folder"] = args.folder
+
+    stop = threading.Event()
+    def on_signal(signum, frame):
+        if stop.is_set():
+            print("Exiting without draining")
+            os._exit(1)
+        print("Stopping, finishing files in progress (signal again to exit now)...")
+        stop.set()
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+    if hasattr(signal, "SIGBREAK"): signal.signal(signal.SIGBREAK, on_signal)  # Ctrl+Break / console close on Windows
+
+    metrics.METRICS.serve(config.get("metrics_port"))
+    folders = load_json(CONFIG_FILE)
+    history = HistoryLog(legacy_path=HISTORY_FILE)
+    catalog = Catalog()
+    if catalog.count() == 0 and not history.empty(): import_history(catalog, history, folders)
+    recorder = Recorder(load_stats(), history, catalog)
+
+    def callback(type_, data):
+        if type_ == "success":
+            recorder.record(data, folder_description(folders, data.get("folder")))
+            print(f"{data['old']} -> {data['new']}" + (f" [{data['folder']}]" if data.get("folder") else ""))
+        elif type_ == "critical_error":
+            print(data)
+            stop.set()
+
+    handler = ScreenshotHandler(callback, config, folders)
+    observer = Observer()
+    observer.schedule(handler, args.folder, recursive=False)
+    observer.start()
+    print(f"Monitoring {args.folder} ({len(folders)} smart folders)")
+
+    # Short waits so signals are handled promptly on every platform.
+    while not stop.wait(1): pass
+
+    observer.stop()
+    observer.join()
+    handler.stop(drain=True)
+    catalog.close()
+    counters = metrics.METRICS.snapshot()["counters"]
+    print(f"Stopped: {counters.get('files_succeeded', 0)} processed, {counters.get('files_failed', 0)} failed")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+import os
+import json
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from watchdog.events import FileSystemEventHandler
+
+FOLDER_STATS_FILE = "folder_stats.json"
+SAVE_DELAY = 5
+
+def scan_folder(folder):
+    """{path: size} for every file under folder (symlinks count, with size 0), via os.scandir."""
+    files = {}
+    stack = [folder]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_symlink():
+                            files[entry.path] = 0
+                        else:
+                            files[entry.path] = entry.stat(follow_symlinks=False).st_size
+                    except OSError: pass
+        except OSError: pass
+    return files
+
+class _Events(FileSystemEventHandler):
+    def __init__(self, service, folder):
+        self.service = service
+        self.folder = folder
+
+    def on_created(self, event):
+        if not event.is_directory: self.service.file_changed(self.folder, event.src_path)
+    def on_modified(self, event):
+        if not event.is_directory: self.service.file_changed(self.folder, event.src_path)
+    def on_deleted(self, event):
+        if not event.is_directory: self.service.file_removed(self.folder, event.src_path)
+    def on_moved(self, event):
+        if event.is_directory: return
+        self.service.file_removed(self.folder, event.src_path)
+        self.service.file_changed(self.folder, event.dest_path)
+
+class FolderStats:
+    """Size and file count per smart folder, kept current without rescanning.
+
+    Totals from the last run are loaded from disk so a page can render at
+    once. Each folder is then rescanned once with os.scandir on a worker
+    pool, and after that kept up to date by sort_file (file_added) and by
+    filesystem events. Changes are tracked per file path, so the same file
+    reported by both never counts twice."""
+
+    def __init__(self, path=FOLDER_STATS_FILE, workers=4, on_change=None):
+        self.path = path
+        self.on_change = on_change
+        self.lock = threading.Lock()
+        self.watch_lock = threading.Lock()  # observer and watched
+        self.totals = {}   # folder -> {"size", "count"}
+        self.files = {}    # folder -> {file path: size}, once scanned
+        self.scanning = {} # folder -> {file path: size or None} seen while its scan runs
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="folder-stats")
+        self.observer = None
+        self.watched = set()
+        self.save_timer = None
+        self.load()
+
+    def key(self, folder):
+        return os.path.normcase(os.path.abspath(folder))
+
+    def load(self):
+        if not os.path.exists(self.path): return
+        try:
+            with open(self.path, 'r') as f: self.totals = json.load(f)
+        except: pass
+
+    def save(self):
+        with self.lock:
+            self.save_timer = None
+            data = dict(self.totals)
+        try:
+            tmp = self.path + ".tmp"
+            with open(tmp, 'w') as f: json.dump(data, f, indent=4)
+            os.replace(tmp, self.path)
+        except Exception as e: print(f"Folder Stats Save Error: {e}")
+
+    def schedule_save(self):
+        # Called with the lock held; coalesces bursts of updates into one write.
+        if self.save_timer is None:
+            self.save_timer = threading.Timer(SAVE_DELAY, self.save)
+            self.save_timer.daemon = True
+            self.save_timer.start()
+
+    def get(self, folder):
+        """(size, count) from the cache, or None if this folder was never scanned."""
+        t = self.totals.get(self.key(folder))
+        return (t["size"], t["count"]) if t else None
+
+    def watch(self, folders):
+        """Scan folders not scanned yet this run and follow their changes."""
+        for folder in folders:
+            k = self.key(folder)
+            self.follow(k, folder)
+            with self.lock:
+                if k in self.files or k in self.scanning: continue
+                self.scanning[k] = {}
+            self.pool.submit(self.scan, k, folder)
+
+    def follow(self, k, folder):
+        # Called from the Tk thread (pages) and commit workers (file_added). Not under self.lock:
+        # the observer holds its own lock while our event handlers take self.lock.
+        with self.watch_lock:
+            if k in self.watched or not os.path.isdir(folder): return
+            if self.observer is None:
+                from watchdog.observers import Observer  # starts a platform backend; only needed once a page watches
+                self.observer = Observer()
+                self.observer.daemon = True
+                self.observer.start()
+            try:
+                self.observer.schedule(_Events(self, k), folder, recursive=True)
+                self.watched.add(k)
+            except Exception as e: print(f"Folder Stats Watch Error: {e}")
+
+    def scan(self, k, folder):
+        try:
+            files = {self.key(p): size for p, size in scan_folder(folder).items()} if os.path.isdir(folder) else {}
+        except Exception:
+            traceback.print_exc()
+            files = {}
+        with self.lock:
+            for path, size in self.scanning.pop(k, {}).items():
+                if size is None: files.pop(path, None)
+                else: files[path] = size
+            self.files[k] = files
+            self.set_total(k)
+        self.changed(k)
+
+    def set_total(self, k):
+        files = self.files[k]
+        self.totals[k] = {"size": sum(files.values()), "count": len(files)}
+        self.schedule_save()
+
+    def update(self, k, path, size):
+        # size None means removed.
+        path = self.key(path)
+        with self.lock:
+            if k in self.scanning:
+                self.scanning[k][path] = size
+                return
+            files = self.files.get(k)
+            if files is None: return
+            old = files.get(path)
+            if size is None:
+                if old is None: return
+                del files[path]
+            else:
+                if old == size: return
+                files[path] = size
+            t = self.totals.setdefault(k, {"size": 0, "count": 0})
+            t["size"] += (size or 0) - (old or 0)
+            t["count"] += (size is not None) - (old is not None)
+            self.schedule_save()
+        self.changed(k)
+
+    def file_added(self, folder, path):
+        k = self.key(folder)
+        # The first file in a folder may have just created it.
+        if k not in self.watched: self.watch([folder])
+        self.file_changed(k, path)
+
+    def file_changed(self, k, path):
+        try: size = os.path.getsize(path)
+        except OSError: return
+        self.update(k, path, size)
+
+    def file_removed(self, k, path):
+        self.update(k, path, None)
+
+    def changed(self, k):
+        if self.on_change:
+            try: self.on_change(k)
+            except Exception as e: print(f"Folder Stats Error: {e}")
+
+    def stop(self):
+        with self.watch_lock: observer = self.observer
+        if observer:
+            observer.stop()
+            observer.join(timeout=5)
+        self.pool.shutdown(wait=False)
+        self.save()
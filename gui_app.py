@@ -1,20 +1,27 @@
+import time
+STARTED = time.perf_counter()  # startup is measured from here, before the heavy imports
 import customtkinter as ctk
 import os
 import threading
-import time
-import json
-import shutil
 import sys
-import pystray
 import random
 import math
 import tkinter
 import traceback
+import queue
+import functools
+from collections import OrderedDict
 from tkinter import messagebox
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
-from google import genai
 from PIL import Image, ImageDraw, ImageTk, ImageEnhance, ImageFilter
+import client_pool
+import metrics
+from core import (ScreenshotHandler, Recorder, folder_description, import_history, load_json, save_json, load_stats,
+                  load_app_config, save_app_config, CONFIG_FILE, HISTORY_FILE)
+from backfill import Backfill
+from history_log import HistoryLog
+from catalog import Catalog
+from thumbnails import ThumbnailCache
+from folder_stats import FolderStats
 
 # --- THEME CONSTANTS ---
 THEME_BG_DARK = "#000000"
@@ -26,216 +33,95 @@ THEME_TEXT_GRAY = "#888888"
 THEME_BG_LIGHT = "#FFFFFF"
 THEME_TEXT_DARK = "#000000"
 
-CONFIG_FILE = "smart_folders.json"
-HISTORY_FILE = "history.json"
-STATS_FILE = "stats.json"
-APP_CONFIG_FILE = "app_config.json"
-
-# --- HELPERS ---
-def load_json(file_path):
-    if os.path.exists(file_path):
-        try:
-            with open(file_path, 'r') as f: return json.load(f)
-        except: return []
-    return []
-
-def save_json(file_path, data):
-    with open(file_path, 'w') as f: json.dump(data, f, indent=4)
-
-def load_stats():
-    if os.path.exists(STATS_FILE):
-        try:
-            with open(STATS_FILE, 'r') as f: return json.load(f)
-        except: pass
-    return {"total_count": 0, "is_pro": False}
-
-def save_stats(stats):
-    with open(STATS_FILE, 'w') as f: json.dump(stats, f, indent=4)
-
-def load_app_config():
-    default = {"api_key": "", "model": "gemini-2.5-flash", "track_folder": "", "dest_folder": ""}
-    if os.path.exists(APP_CONFIG_FILE):
-        try:
-            with open(APP_CONFIG_FILE, 'r') as f:
-                data = json.load(f)
-                default.update(data)
-                default["model"] = "gemini-2.5-flash"
-        except: pass
-    return default
-
-def save_app_config(config):
-    config["model"] = "gemini-2.5-flash"
-    with open(APP_CONFIG_FILE, 'w') as f: json.dump(config, f, indent=4)
-
-def extract_json(text):
-    try:
-        text = text.strip()
-        start = text.find('{')
-        end = text.rfind('}')
-        if start != -1 and end != -1:
-            return json.loads(text[start:end+1])
-        return json.loads(text)
-    except: return None
-
-# --- LOGIC ---
-class ScreenshotHandler(FileSystemEventHandler):
-    def __init__(self, app_callback, config, folders):
-        self.app_callback = app_callback
-        self.config = config
-        self.folders = folders
-
-    def on_created(self, event):
-        if event.is_directory: return
-        filename = event.src_path
-        ext = os.path.splitext(filename)[1].lower()
-        if ext in ['.png', '.jpg', '.jpeg']:
-            self.app_callback("detect", filename)
-            threading.Thread(target=self.process_image_thread, args=(filename,)).start()
-
-    def process_image_thread(self, file_path):
-        time.sleep(2)
-        self.process_image(file_path)
-
-    def process_image(self, file_path):
-        try:
-            for _ in range(3):
-                try:
-                    with Image.open(file_path) as img:
-                        img.verify()
-                    break
-                except:
-                    time.sleep(1)
-            
-            result = self.analyze_image(file_path)
-            if result:
-                new_name = result.get("filename")
-                folder_match = result.get("folder")
-                
-                if new_name:
-                    old_name = os.path.basename(file_path)
-                    new_path = self.rename_file(file_path, new_name)
-                    
-                    if new_path:
-                        final_name = os.path.basename(new_path)
-                        self.app_callback("success", {"path": new_path, "old": old_name, "new": final_name})
-                        if folder_match: self.sort_file(new_path, folder_match)
-        except Exception as e:
-            msg = str(e).lower()
-            if "403" in msg or "leaked" in msg or "permission_denied" in msg:
-                self.app_callback("critical_error", "Your API Key is invalid or leaked.\nPlease update it in Settings.")
-            else:
-                print(f"Error: {e}")
-                traceback.print_exc()
-
-    def analyze_image(self, file_path):
-        try:
-            client = genai.Client(api_key=self.config["api_key"])
-            img = Image.open(file_path)
-            
-            folder_info = [f"{f['name']} (Description: {f.get('description', '')})" for f in self.folders]
-            categories_prompt = "No specific folders."
-            if folder_info:
-                categories_prompt = f"Match with one of these folders if appropriate based on name and description: {'; '.join(folder_info)}."
-            
-            prompt = (
-                f"Analyze this image. Provide a JSON object with two keys:\n"
-                f"1. 'filename': A short, descriptive filename (2-5 words), using underscores instead of spaces. No extension.\n"
-                f"2. 'folder': The exact name of the matching folder from the list below, or null if no match.\n"
-                f"{categories_prompt}\n"
-                f"Respond ONLY with valid JSON."
-            )
-            
-            response = client.models.generate_content(model=self.config["model"], contents=[prompt, img])
-            if response.text:
-                return extract_json(response.text)
-        except Exception as e:
-            print(f"Analyze Error: {e}")
-            traceback.print_exc()
-            msg = str(e).lower()
-            if "403" in msg or "leaked" in msg or "permission_denied" in msg:
-                raise e
-            return None
-
-    def rename_file(self, file_path, label):
-        directory = os.path.dirname(file_path)
-        ext = os.path.splitext(file_path)[1]
-        safe_label = "".join([c for c in label if c.isalnum() or c in (' ', '-', '_')]).strip().replace(' ', '_')[:50]
-        new_name = f"{safe_label}{ext}"
-        new_path = os.path.join(directory, new_name)
-        counter = 1
-        while os.path.exists(new_path):
-            new_name = f"{safe_label}_{counter}{ext}"
-            new_path = os.path.join(directory, new_name)
-            counter += 1
-        try:
-            os.rename(file_path, new_path)
-            return new_path
-        except: return None
-
-    def sort_file(self, file_path, folder_name):
-        try:
-            dest_base = self.config.get("dest_folder")
-            if not dest_base or not os.path.exists(dest_base):
-                dest_base = self.controller.app_config.get("track_folder")
-                if not dest_base: return
-            
-            target_dir = os.path.join(dest_base, folder_name)
-            if not os.path.exists(target_dir): os.makedirs(target_dir)
-            
-            filename = os.path.basename(file_path)
-            target_path = os.path.join(target_dir, filename)
-            
-            if os.path.exists(target_path):
-                base, ext = os.path.splitext(filename)
-                target_path = os.path.join(target_dir, f"{base}_{int(time.time())}{ext}")
-            
-            shutil.copy2(file_path, target_path)
-            print(f"Copied to {target_path}")
-        except Exception as e:
-            print(f"Sort Error: {e}")
-            traceback.print_exc()
+# --- ASSETS ---
+# Rendered once per process and shared by every widget that shows them.
+@functools.lru_cache(maxsize=None)
+def glow_image(size=250, radius=70, blur=30):
+    image = Image.new('RGBA', (size, size), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    center = size // 2
+    draw.ellipse((center-radius, center-radius, center+radius, center+radius), fill=(239, 68, 68, 100))
+    return image.filter(ImageFilter.GaussianBlur(radius=blur))
+
+@functools.lru_cache(maxsize=None)
+def icon(path, size):
+    pil_image = Image.open(path)
+    pil_image.load()
+    return ctk.CTkImage(light_image=pil_image, dark_image=pil_image, size=size)
 
 # --- APP ---
 class App(ctk.CTk):
     def __init__(self):
         super().__init__()
+        self.started = time.perf_counter()
         self.title("AI Renamer")
         self.geometry("1000x700")
         self.configure(fg_color=THEME_BG_DARK)
         
         self.stats = load_stats()
         self.smart_folders = load_json(CONFIG_FILE)
-        self.history = load_json(HISTORY_FILE)
+        self.history = HistoryLog(legacy_path=HISTORY_FILE)
+        self.catalog = Catalog()
+        self.recorder = Recorder(self.stats, self.history, self.catalog)
         self.app_config = load_app_config()
+        self.thumbnails = ThumbnailCache(max_bytes=self.app_config.get("thumbnail_cache_mb", 200) * 1024 * 1024, scan=False)
+        self.folder_stats = FolderStats(on_change=lambda k: self.after(0, lambda: self.on_folder_stats(k)))
         
         if not self.app_config["track_folder"]:
             self.app_config["track_folder"] = os.path.join(os.environ['USERPROFILE'], 'Pictures', 'Screenshots')
 
         self.protocol("WM_DELETE_WINDOW", self.minimize_to_tray)
-        self.setup_tray()
+        self.tray_icon = None
         
         self.container = ctk.CTkFrame(self, fg_color="transparent")
         self.container.pack(fill="both", expand=True)
         self.container.grid_rowconfigure(0, weight=1)
         self.container.grid_columnconfigure(0, weight=1)
         
+        # Pages are built the first time they're shown, so startup only pays for the main menu.
+        self.pages = {"MainMenu": MainMenu, "SettingsPage": SettingsPage, "FoldersPage": FoldersPage,
+                      "GalleryPage": GalleryPage}
         self.frames = {}
-        for F in (MainMenu, SettingsPage, FoldersPage, GalleryPage):
-            page_name = F.__name__
-            frame = F(parent=self.container, controller=self)
-            self.frames[page_name] = frame
-            frame.grid(row=0, column=0, sticky="nsew")
 
         self.show_frame("MainMenu")
         self.observer = None
+        self.handler = None
+        self.backfill = None
         self.monitoring = False
+        self.after_idle(self.on_ready)
 
     def show_frame(self, page_name):
-        frame = self.frames[page_name]
+        frame = self.frames.get(page_name)
+        if frame is None:
+            frame = self.frames[page_name] = self.pages[page_name](parent=self.container, controller=self)
+            frame.grid(row=0, column=0, sticky="nsew")
         frame.tkraise()
         if hasattr(frame, 'refresh'): frame.refresh()
 
+    def on_ready(self):
+        # First idle pass of the main loop: the window is drawn and takes input.
+        self.update_idletasks()
+        now = time.perf_counter()
+        metrics.observe("startup", now - STARTED)
+        print(f"Startup: {(now - STARTED) * 1000:.0f} ms to interactive "
+              f"(imports {(self.started - STARTED) * 1000:.0f} ms, window {(now - self.started) * 1000:.0f} ms)")
+        self.setup_tray()
+        threading.Thread(target=self.warm_up, name="warm-up", daemon=True).start()
+
+    def warm_up(self):
+        # Startup work that touches the disk or the network; none of it is needed to draw the window.
+        try: self.thumbnails.measure()
+        except Exception as e: print(f"Thumbnail Cache Error: {e}")
+        try: metrics.METRICS.serve(self.app_config.get("metrics_port"))
+        except Exception as e: print(f"Metrics Server Error: {e}")
+        if self.catalog.count() == 0 and not self.history.empty(): self.import_catalog()
+
+    def on_folder_stats(self, key):
+        page = self.frames.get("FoldersPage")
+        if page: page.update_stats(key)
+
     def setup_tray(self):
+        import pystray
         image = Image.new('RGB', (64, 64), color=(233, 69, 96))
         draw = ImageDraw.Draw(image)
         draw.ellipse((16, 16, 48, 48), fill="white")
@@ -245,27 +131,36 @@ class App(ctk.CTk):
 
     def minimize_to_tray(self): self.withdraw()
     def show_window(self, icon=None, item=None): self.deiconify(); self.lift()
-    def quit_app(self, icon=None, item=None): self.tray_icon.stop(); self.quit(); sys.exit()
+    def quit_app(self, icon=None, item=None):
+        if self.tray_icon: self.tray_icon.stop()
+        self.folder_stats.stop(); self.quit(); sys.exit()
+
+    def can_start(self):
+        if not self.check_limit():
+            messagebox.showinfo("Limit Reached", "Upgrade to Pro! Limit is 50.")
+            return False
+        if self.app_config.get("labeler", "gemini") == "gemini" and not self.app_config["api_key"]:
+            messagebox.showwarning("Config", "Please set API Key in Settings.")
+            self.show_frame("SettingsPage")
+            return False
+        
+        path = self.app_config["track_folder"]
+        if not os.path.exists(path):
+            messagebox.showerror("Error", f"Folder not found: {path}\nPlease check Settings.")
+            return False
+        return True
 
     def toggle_monitoring(self):
         if not self.monitoring:
-            if not self.check_limit():
-                messagebox.showinfo("Limit Reached", "Upgrade to Pro! Limit is 50.")
-                return False
-            if not self.app_config["api_key"]:
-                messagebox.showwarning("Config", "Please set API Key in Settings.")
-                self.show_frame("SettingsPage")
-                return False
-            
+            if not self.can_start(): return False
             path = self.app_config["track_folder"]
-            if not os.path.exists(path):
-                messagebox.showerror("Error", f"Folder not found: {path}\nPlease check Settings.")
-                return False
             
             try:
+                from watchdog.observers import Observer
+                if self.app_config.get("labeler", "gemini") == "gemini": client_pool.get_client(self.app_config["api_key"])
                 self.observer = Observer()
-                handler = ScreenshotHandler(self.handle_event, self.app_config, self.smart_folders)
-                self.observer.schedule(handler, path, recursive=False)
+                self.handler = ScreenshotHandler(self.handle_event, self.app_config, self.smart_folders, self.folder_stats)
+                self.observer.schedule(self.handler, path, recursive=False)
                 self.observer.start()
                 self.monitoring = True
                 return True 
@@ -277,25 +172,62 @@ class App(ctk.CTk):
             if self.observer: 
                 self.observer.stop()
                 self.observer.join()
+            if self.handler:
+                # Drain queued files in the background so the UI doesn't block.
+                threading.Thread(target=self.handler.stop, daemon=True).start()
             self.observer = None
+            self.handler = None
             self.monitoring = False
             return False 
 
+    def toggle_backfill(self):
+        """Process files already sitting in track_folder. Returns True if a run was started."""
+        if self.backfill:
+            self.backfill.cancel()
+            return False
+        if not self.can_start(): return False
+
+        menu = self.frames["MainMenu"]
+        # Cheap to build: the history is only read, and the handler only made, on the worker below.
+        job = self.backfill = Backfill(None, self.app_config["track_folder"], self.history.iter_entries(),
+                                       workers=self.app_config.get("backfill_workers", 4),
+                                       batch_size=self.app_config.get("analyze_batch_size", 4))
+        def run():
+            try:
+                job.handler = ScreenshotHandler(self.handle_event, self.app_config, self.smart_folders, self.folder_stats)
+                job.run(progress=lambda d, t: self.after(0, lambda: menu.update_backfill(d, t)))
+            except Exception as e:
+                print(f"Backfill Error: {e}")
+                traceback.print_exc()
+            finally:
+                if job.handler: job.handler.stop()
+                self.backfill = None
+                self.after(0, menu.update_backfill)
+        threading.Thread(target=run, daemon=True).start()
+        return True
+
     def check_limit(self):
         limit = 20000 if self.stats.get("is_pro") else 50
         return self.stats.get("total_count", 0) < limit
 
     def handle_event(self, type_, data):
         if type_ == "success":
-            self.stats["total_count"] = self.stats.get("total_count", 0) + 1
-            save_stats(self.stats)
-            self.history.append(data)
-            save_json(HISTORY_FILE, self.history)
+            self.recorder.record(data, folder_description(self.smart_folders, data.get("folder")))
+            # Thumbnail now, while we're off the UI thread, so the gallery only reads small files.
+            try: self.thumbnails.ensure(data["path"])
+            except Exception as e: print(f"Thumbnail Error: {e}")
             self.after(0, self.frames["MainMenu"].update_ui)
+            # An unbuilt gallery reads the catalog when it's first shown.
+            gallery = self.frames.get("GalleryPage")
+            if gallery: self.after(0, lambda: gallery.on_new_entry(data))
         elif type_ == "critical_error":
             self.after(0, lambda: self.handle_critical_error(data))
 
+    def import_catalog(self):
+        import_history(self.catalog, self.history, self.smart_folders)
+
     def handle_critical_error(self, message):
+        if self.backfill: self.backfill.cancel()
         if self.monitoring:
             self.toggle_monitoring()
             self.frames["MainMenu"].update_status(False)
@@ -314,16 +246,12 @@ class MainMenu(ctk.CTkFrame):
         self.progress_val = 0
         self.limit_val = 50
         self.glowing = True
+        self.animate_job = None
+        self.resize_job = None
+        self.drawn = {}
 
         # Create glow effect image
-        glow_size = 250
-        self.glow_image_pil = Image.new('RGBA', (glow_size, glow_size), (0, 0, 0, 0))
-        glow_draw = ImageDraw.Draw(self.glow_image_pil)
-        center = glow_size // 2
-        radius = 70
-        glow_draw.ellipse((center-radius, center-radius, center+radius, center+radius), fill=(239, 68, 68, 100))
-        self.glow_image_pil = self.glow_image_pil.filter(ImageFilter.GaussianBlur(radius=30))
-        self.glow_image_tk = ImageTk.PhotoImage(self.glow_image_pil)
+        self.glow_image_tk = ImageTk.PhotoImage(glow_image())
 
 
         # --- HEADER ---
@@ -333,7 +261,7 @@ class MainMenu(ctk.CTkFrame):
         logo_frame = ctk.CTkFrame(header, fg_color="transparent")
         logo_frame.pack(side="left")
 
-        box_icon = ctk.CTkImage(Image.open("box (1).png"), size=(28, 28))
+        box_icon = icon("box (1).png", (28, 28))
         logo_icon_label = ctk.CTkLabel(logo_frame, text="", image=box_icon)
         logo_icon_label.pack(side="left", padx=(0,12))
 
@@ -343,7 +271,7 @@ class MainMenu(ctk.CTkFrame):
         header_actions = ctk.CTkFrame(header, fg_color="transparent")
         header_actions.pack(side="right")
 
-        sparkles_icon = ctk.CTkImage(Image.open("sparkles (1).png"), size=(16, 16))
+        sparkles_icon = icon("sparkles (1).png", (16, 16))
         upgrade_btn = ctk.CTkButton(header_actions, text="Upgrade Plan", image=sparkles_icon,
                                      fg_color="#09090b", text_color="white",
                                      border_width=1, border_color="#27272a",
@@ -354,7 +282,7 @@ class MainMenu(ctk.CTkFrame):
                                      )
         upgrade_btn.pack(side="left", padx=16)
 
-        settings_icon = ctk.CTkImage(Image.open("settings (1).png"), size=(24,24))
+        settings_icon = icon("settings (1).png", (24, 24))
         settings_btn = ctk.CTkButton(header_actions, text="", image=settings_icon, fg_color="transparent",
                                        width=40, height=40,
                                        font=("Permanent Marker", 24),
@@ -370,8 +298,11 @@ class MainMenu(ctk.CTkFrame):
 
         self.canvas = ctk.CTkCanvas(self.progress_container, bg=THEME_BG_DARK, highlightthickness=0, width=400, height=400)
         self.canvas.pack()
+        self.build_canvas()
         
         self.bind("<Configure>", self.on_resize)
+        # No spinning while withdrawn to the tray; picks up again when the window is shown.
+        self.winfo_toplevel().bind("<Map>", self.on_map, add="+")
         
         center_content = ctk.CTkFrame(self.progress_container, fg_color="transparent")
         center_content.place(relx=0.5, rely=0.5, anchor="center")
@@ -386,6 +317,19 @@ class MainMenu(ctk.CTkFrame):
 
         self.counter_label = ctk.CTkLabel(center_content, text="0 / 50", font=("Permanent Marker", 18, "bold"), text_color="#a1a1aa")
         self.counter_label.pack()
+
+        self.backfill_btn = ctk.CTkButton(center_content, text="Process existing",
+                                          fg_color="#09090b", text_color="#a1a1aa", hover_color="#27272a",
+                                          border_width=1, border_color="#27272a",
+                                          font=("Permanent Marker", 12), corner_radius=100,
+                                          width=140, height=28,
+                                          command=self.toggle_backfill)
+        self.backfill_btn.pack(pady=(12, 0))
+
+        # --- PIPELINE STATS ---
+        self.metrics_label = ctk.CTkLabel(main_stage, text="", font=("Consolas", 11), text_color="#52525b", justify="left")
+        self.metrics_label.place(relx=0, rely=1, x=24, anchor="sw")
+        self.update_metrics()
         
         # --- NAV ACTIONS ---
         nav_actions = ctk.CTkFrame(self, fg_color="transparent")
@@ -412,8 +356,7 @@ class MainMenu(ctk.CTkFrame):
         icon_frame.grid_propagate(False) # This is important, to prevent the frame from shrinking to the image size
         icon_frame.bind("<Button-1>", command)
         
-        pil_image = Image.open(icon_path)
-        icon_image = ctk.CTkImage(light_image=pil_image, dark_image=pil_image, size=(22, 22))
+        icon_image = icon(icon_path, (22, 22))
 
         icon_label = ctk.CTkLabel(icon_frame, text="", image=icon_image)
         icon_label.place(relx=0.5, rely=0.5, anchor="center")
@@ -431,46 +374,73 @@ class MainMenu(ctk.CTkFrame):
         subtitle_label.pack(anchor="w")
         subtitle_label.bind("<Button-1>", command)
     
-    def on_resize(self, event=None):
-        self.draw_canvas()
-        
-    def draw_canvas(self):
-        self.canvas.delete("all")
+    def build_canvas(self):
+        # Items are created once; redraws only change what moved (retained mode).
+        self.glow_item = self.canvas.create_image(0, 0, image=self.glow_image_tk)
+        self.ring_item = self.canvas.create_oval(0, 0, 0, 0, outline="#27272a", width=12)
+        self.progress_item = self.canvas.create_arc(0, 0, 0, 0, start=90, extent=0, outline="#10b981", width=12, style="arc")
+        self.spinner_items = [self.canvas.create_arc(0, 0, 0, 0, start=0, extent=80, outline="#ffffff", width=4,
+                                                     style="arc", state="hidden") for _ in range(2)]
+        self.layout_canvas()
+
+    def layout_canvas(self):
+        self.resize_job = None
         w, h = 400, 400
         cx, cy = w/2, h/2
+        r = 180
+        self.canvas.coords(self.glow_item, cx, cy)
+        for item in [self.ring_item, self.progress_item] + self.spinner_items:
+            self.canvas.coords(item, cx-r, cy-r, cx+r, cy+r)
+        self.drawn.clear()
+        self.draw_canvas()
 
-        if self.glowing:
-            self.canvas.create_image(cx, cy, image=self.glow_image_tk)
+    def on_resize(self, event=None):
+        # A drag fires <Configure> for every pixel; lay out once it settles.
+        if self.resize_job: self.after_cancel(self.resize_job)
+        self.resize_job = self.after(100, self.layout_canvas)
+
+    def set_item(self, item, **options):
+        # itemconfig only on change, so an unchanged frame costs Tk nothing.
+        if self.drawn.get(item) != options:
+            self.canvas.itemconfigure(item, **options)
+            self.drawn[item] = options
+
+    def draw_canvas(self):
+        self.set_item(self.glow_item, state="normal" if self.glowing else "hidden")
 
-        r = 180
-        
-        # Ring Background
-        self.canvas.create_oval(cx-r, cy-r, cx+r, cy+r, outline="#27272a", width=12)
-        
         # Progress Arc
-        if self.limit_val > 0:
-            angle = (self.progress_val / self.limit_val) * 360
-            if angle > 360: angle = 360
-            self.canvas.create_arc(cx-r, cy-r, cx+r, cy+r, start=90, extent=-angle, outline="#10b981", width=12, style="arc")
-            
+        angle = min(360, (self.progress_val / self.limit_val) * 360) if self.limit_val > 0 else 0
+        self.set_item(self.progress_item, extent=-angle, state="normal" if angle else "hidden")
+
         # Spinner
-        if self.is_animating:
-            r_spin = r # Spinner on the same radius
-            self.canvas.create_arc(cx-r, cy-r, cx+r, cy+r, start=self.angle_offset, extent=80, outline="#ffffff", width=4, style="arc")
-            self.canvas.create_arc(cx-r, cy-r, cx+r, cy+r, start=self.angle_offset+180, extent=80, outline="#ffffff", width=4, style="arc")
+        for i, item in enumerate(self.spinner_items):
+            if self.is_animating: self.set_item(item, start=self.angle_offset + 180 * i, state="normal")
+            else: self.set_item(item, state="hidden")
+
+    def on_map(self, event=None):
+        if self.is_animating and not self.animate_job: self.animate()
 
     def animate(self):
-        if self.is_animating:
-            self.angle_offset = (self.angle_offset - 15) % 360
-            self.draw_canvas()
-            self.after(30, self.animate)
+        self.animate_job = None
+        if not self.is_animating: return
+        if not self.winfo_viewable(): return  # withdrawn to the tray; <Map> restarts it
+        self.angle_offset = (self.angle_offset - 15) % 360
+        self.draw_canvas()
+        self.animate_job = self.after(30, self.animate)
 
     def update_ui(self):
         count = self.controller.stats.get("total_count", 0)
+        if count == self.progress_val and self.drawn: return
         self.progress_val = count
         self.counter_label.configure(text=f"{count} / 50")
         self.draw_canvas()
 
+    def update_metrics(self):
+        # Every 2s, only while the page is showing.
+        if self.winfo_viewable():
+            self.metrics_label.configure(text=format_metrics(metrics.METRICS.snapshot(), self.controller.stats))
+        self.after(2000, self.update_metrics)
+
     def toggle(self):
         if self.controller.monitoring:
             self.controller.toggle_monitoring()
@@ -478,9 +448,22 @@ class MainMenu(ctk.CTkFrame):
         else:
             self.power_btn.configure(text="LOADING...", fg_color="#E0E0E0", text_color="black", state="disabled")
             self.is_animating = True
-            self.animate()
+            self.on_map()
             self.after(3000, self.finish_start)
 
+    def toggle_backfill(self):
+        if self.controller.backfill:
+            self.controller.toggle_backfill()
+            self.backfill_btn.configure(text="Stopping...")
+        elif self.controller.toggle_backfill():
+            self.backfill_btn.configure(text="Scanning...")
+
+    def update_backfill(self, done=None, total=None):
+        if done is None:
+            self.backfill_btn.configure(text="Process existing")
+        else:
+            self.backfill_btn.configure(text=f"{done} / {total}  ✕")
+
     def finish_start(self):
         self.is_animating = False
         self.power_btn.configure(state="normal")
@@ -585,20 +568,6 @@ class SettingsPage(ctk.CTkFrame):
 
 import datetime
 
-def get_folder_stats(folder_path):
-    if not os.path.exists(folder_path):
-        return 0, 0
-    
-    total_size = 0
-    file_count = 0
-    for dirpath, dirnames, filenames in os.walk(folder_path):
-        for f in filenames:
-            fp = os.path.join(dirpath, f)
-            if not os.path.islink(fp):
-                total_size += os.path.getsize(fp)
-            file_count += 1
-    return total_size, file_count
-
 def format_size(size_bytes):
     if size_bytes == 0:
         return "0 B"
@@ -608,6 +577,24 @@ def format_size(size_bytes):
     s = round(size_bytes / p, 1)
     return f"{s} {size_name[i]}"
 
+def format_seconds(seconds):
+    if seconds is None: return "-"
+    return f"{seconds * 1000:.0f}ms" if seconds < 1 else f"{seconds:.1f}s"
+
+def format_metrics(snapshot, stats):
+    """Stage latency table plus counters for the stats panel; empty until something ran."""
+    stages = snapshot["stages"]
+    if not stages: return ""
+    lines = [f"{'stage':<11}{'p50':>8}{'p95':>8}{'p99':>8}{'n':>7}"]
+    for stage in metrics.STAGES:
+        st = stages.get(stage)
+        if st: lines.append(f"{stage:<11}" + "".join(f"{format_seconds(st[q]):>8}" for q in ("p50", "p95", "p99")) + f"{st['count']:>7}")
+    c = snapshot["counters"]
+    lines.append(f"ok {c.get('files_succeeded', 0)}  failed {c.get('files_failed', 0)}  "
+                 f"cached {c.get('cache_hits', 0) + c.get('near_duplicate_hits', 0)}  retries {c.get('retries', 0)}")
+    lines.append(f"uploaded {format_size(c.get('bytes_uploaded', 0))}  all time {stats.get('total_count', 0)}")
+    return "\n".join(lines)
+
 class FoldersPage(ctk.CTkFrame):
     def __init__(self, parent, controller):
         super().__init__(parent, fg_color=THEME_BG_DARK)
@@ -640,8 +627,30 @@ class FoldersPage(ctk.CTkFrame):
         if changed:
             save_json(CONFIG_FILE, self.controller.smart_folders)
 
+        self.stat_labels = {}
         for i, f in enumerate(self.controller.smart_folders):
             self.create_card(f, i)
+        # Scans (first time only) and watches off the UI thread; labels update via update_stats.
+        self.controller.folder_stats.watch([self.folder_path(f['name']) for f in self.controller.smart_folders
+                                            if self.folder_path(f['name'])])
+
+    def folder_path(self, folder_name):
+        dest_base = self.controller.app_config.get("dest_folder") or self.controller.app_config.get("track_folder")
+        return os.path.join(dest_base, folder_name) if dest_base else ""
+
+    def stats_text(self, stats):
+        if stats is None: return "Scanning...", "—"
+        size, count = stats
+        return (f"{count} files" if count > 0 else "Empty"), format_size(size)
+
+    def update_stats(self, key):
+        labels = self.stat_labels.get(key)
+        if not labels: return
+        count_text, size_text = self.stats_text(self.controller.folder_stats.get(key))
+        try:
+            labels[0].configure(text=count_text)
+            labels[1].configure(text=size_text)
+        except tkinter.TclError: pass  # card destroyed by a refresh meanwhile
 
     def create_card(self, f, i):
         card = ctk.CTkFrame(self.scroll, fg_color=THEME_CARD_DARK, corner_radius=16, height=80)
@@ -656,12 +665,8 @@ class FoldersPage(ctk.CTkFrame):
         name_lbl.grid(row=0, column=1, sticky="w", padx=10)
         name_lbl.bind("<Button-1>", lambda e, name=f['name']: self.open_folder(name))
         
-        dest_base = self.controller.app_config.get("dest_folder") or self.controller.app_config.get("track_folder")
-        folder_path = os.path.join(dest_base, f['name']) if dest_base else ""
-        
-        size, count = get_folder_stats(folder_path)
-        
-        count_text = f"{count} files" if count > 0 else "Empty"
+        folder_path = self.folder_path(f['name'])
+        count_text, size_text = self.stats_text(self.controller.folder_stats.get(folder_path) if folder_path else (0, 0))
         
         count_lbl = ctk.CTkLabel(card, text=count_text, font=("Permanent Marker", 12), text_color=THEME_TEXT_GRAY)
         count_lbl.grid(row=1, column=1, sticky="w", padx=10)
@@ -670,8 +675,9 @@ class FoldersPage(ctk.CTkFrame):
         date_lbl = ctk.CTkLabel(card, text=date_str, font=("Permanent Marker", 12), text_color=THEME_TEXT_GRAY)
         date_lbl.grid(row=0, column=2, rowspan=2, padx=20)
         
-        size_lbl = ctk.CTkLabel(card, text=format_size(size), font=("Permanent Marker", 12), text_color=THEME_TEXT_GRAY)
+        size_lbl = ctk.CTkLabel(card, text=size_text, font=("Permanent Marker", 12), text_color=THEME_TEXT_GRAY)
         size_lbl.grid(row=0, column=3, rowspan=2, padx=20)
+        if folder_path: self.stat_labels[self.controller.folder_stats.key(folder_path)] = (count_lbl, size_lbl)
         
         ctk.CTkButton(card, text="⋮", width=30, fg_color="transparent", text_color="white", font=("Permanent Marker", 20), 
                       command=lambda x=i: self.delete(x)).grid(row=0, column=4, rowspan=2, padx=20)
@@ -706,7 +712,34 @@ class FoldersPage(ctk.CTkFrame):
         save_json(CONFIG_FILE, self.controller.smart_folders)
         self.refresh()
 
+GALLERY_COLS = 3
+CARD_W = 250
+THUMB_H = 160
+CELL_W = CARD_W + 20
+ROW_H = THUMB_H + 50
+GALLERY_PAGE = 120     # catalog rows fetched per query
+GALLERY_MARGIN = 2     # rows materialized above/below the viewport
+GALLERY_IMAGES = 300   # decoded thumbnails kept for quick scroll-back
+
+class GalleryCard:
+    def __init__(self, canvas, placeholder):
+        self.path = None
+        self.frame = ctk.CTkFrame(canvas, fg_color="transparent", width=CARD_W, height=ROW_H - 10)
+        self.btn = ctk.CTkButton(self.frame, text="", image=placeholder, fg_color="transparent", hover=True,
+                                 corner_radius=12, width=CARD_W, height=THUMB_H,
+                                 command=lambda: self.path and os.startfile(self.path))
+        self.btn.pack()
+        self.label = ctk.CTkLabel(self.frame, text="", text_color="white", font=("Permanent Marker", 11))
+        self.label.pack(pady=5)
+        self.window = canvas.create_window(0, 0, window=self.frame, anchor="nw")
+
 class GalleryPage(ctk.CTkFrame):
+    """Virtualized grid over the whole catalog.
+
+    Only the rows in view (plus a margin) have widgets; cards scrolled out
+    of view are recycled for the ones scrolling in. Thumbnails are decoded
+    on a background thread and attached when ready."""
+
     def __init__(self, parent, controller):
         super().__init__(parent, fg_color=THEME_BG_DARK) # Dark Mode
         self.controller = controller
@@ -717,53 +750,172 @@ class GalleryPage(ctk.CTkFrame):
         ctk.CTkButton(header, text="←", width=40, fg_color="transparent", text_color="white", font=("Permanent Marker", 20),
                       command=lambda: controller.show_frame("MainMenu")).pack(side="left")
         ctk.CTkLabel(header, text="Gallery", font=("Permanent Marker", 24, "bold"), text_color="white").pack(side="left", padx=10)
-        
-        self.scroll = ctk.CTkScrollableFrame(self, fg_color="transparent")
-        self.scroll.pack(fill="both", expand=True, padx=20)
-        
-        # Masonry Cols
-        self.cols = [ctk.CTkFrame(self.scroll, fg_color="transparent") for _ in range(3)]
-        for c in self.cols: c.pack(side="left", fill="both", expand=True, padx=5)
 
-    def refresh(self):
-        for c in self.cols:
-            for w in c.winfo_children(): w.destroy()
-            
-        history = list(reversed(self.controller.history[-50:]))
-        
-        for i, item in enumerate(history):
-            path = item.get("path")
-            if path and os.path.exists(path):
-                col_idx = i % 3
-                self.add_image(path, self.cols[col_idx], i)
+        self.search_var = ctk.StringVar()
+        self.search_job = None
+        search = ctk.CTkEntry(header, textvariable=self.search_var, placeholder_text="Search names and folders...",
+                              fg_color=THEME_CARD_DARK, border_width=0, text_color="white", width=260, height=36, corner_radius=8)
+        search.pack(side="right")
+        search.bind("<KeyRelease>", self.on_search)
+
+        body = ctk.CTkFrame(self, fg_color="transparent")
+        body.pack(fill="both", expand=True, padx=20)
+        self.canvas = tkinter.Canvas(body, bg=THEME_BG_DARK, highlightthickness=0, yscrollincrement=20)
+        self.scrollbar = ctk.CTkScrollbar(body, command=self.on_scrollbar)
+        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.canvas.bind("<Configure>", lambda e: self.schedule_update())
+        # Wheel events go to the widget under the pointer, which is usually a card.
+        self.canvas.bind("<Enter>", lambda e: self.bind_wheel(True))
+        self.canvas.bind("<Leave>", lambda e: self.bind_wheel(False))
+
+        self.placeholder = ctk.CTkImage(Image.new("RGBA", (1, 1), (0, 0, 0, 0)), size=(CARD_W, THUMB_H))
+        self.query = ""
+        self.total = 0
+        self.pages = OrderedDict()
+        self.cards = {}
+        self.free = []
+        self.images = OrderedDict()
+        self.update_job = None
+
+        self.decode_requests = queue.LifoQueue()  # newest request first: that's what's on screen
+        self.decoded = queue.Queue()
+        self.pending = set()
+        self.poll_job = None
+        threading.Thread(target=self.decoder, daemon=True).start()
+
+    # --- data ---
+    def on_search(self, event=None):
+        # Debounce: search once typing pauses.
+        if self.search_job: self.after_cancel(self.search_job)
+        self.search_job = self.after(200, self.refresh)
 
-    def add_image(self, path, parent, index):
-        try:
-            pil_img = Image.open(path)
-            # Aspect Ratio
-            w_base = 250
-            w_percent = (w_base / float(pil_img.size[0]))
-            h_size = int((float(pil_img.size[1]) * float(w_percent)))
-            
-            img = ctk.CTkImage(pil_img, size=(w_base, h_size))
-            
-            # Container for hover effect
-            card = ctk.CTkFrame(parent, fg_color="transparent")
-            card.pack(pady=10, fill="x")
-            
-            # Animation delay (staggered)
-            # This requires tricky updating. Simplest is just load.
-            
-            btn = ctk.CTkButton(card, text="", image=img, fg_color="transparent", hover=True,
-                                corner_radius=12, command=lambda p=path: os.startfile(p))
-            btn.pack()
-            
-            # Label
-            name = os.path.basename(path)
-            if len(name) > 20: name = name[:20] + "..."
-            ctk.CTkLabel(card, text=name, text_color="white", font=("Permanent Marker", 11)).pack(pady=5)
-            
-        except: pass
+    def refresh(self):
+        self.search_job = None
+        self.query = self.search_var.get().strip()
+        self.pages.clear()
+        self.total = self.controller.catalog.count(self.query or None)
+        self.canvas.yview_moveto(0)
+        self.update_view()
+
+    def item(self, index):
+        page = index // GALLERY_PAGE
+        rows = self.pages.get(page)
+        if rows is None:
+            rows = self.controller.catalog.search(self.query, GALLERY_PAGE, page * GALLERY_PAGE)
+            self.pages[page] = rows
+            while len(self.pages) > 8: self.pages.popitem(last=False)
+        rows = self.pages[page]
+        i = index - page * GALLERY_PAGE
+        return rows[i] if i < len(rows) else None
+
+    def on_new_entry(self, data):
+        # Newest first: the new card goes in at index 0 and everything shifts by one.
+        if self.query: return
+        self.total += 1
+        self.pages.clear()
+        self.cards = {i + 1: card for i, card in self.cards.items()}
+        if self.winfo_ismapped(): self.update_view()
+
+    # --- view ---
+    def bind_wheel(self, on):
+        if on:
+            self.canvas.bind_all("<MouseWheel>", self.on_wheel)
+            self.canvas.bind_all("<Button-4>", self.on_wheel)
+            self.canvas.bind_all("<Button-5>", self.on_wheel)
+        else:
+            for seq in ("<MouseWheel>", "<Button-4>", "<Button-5>"): self.canvas.unbind_all(seq)
+
+    def on_wheel(self, event):
+        if getattr(event, "num", None) == 4: step = -3
+        elif getattr(event, "num", None) == 5: step = 3
+        else: step = -3 if event.delta > 0 else 3
+        self.canvas.yview_scroll(step, "units")
+        self.schedule_update()
+
+    def on_scrollbar(self, *args):
+        self.canvas.yview(*args)
+        self.schedule_update()
+
+    def schedule_update(self):
+        if self.update_job is None:
+            self.update_job = self.after_idle(self.update_view)
+
+    def update_view(self):
+        self.update_job = None
+        width = max(self.canvas.winfo_width(), CELL_W)
+        rows = math.ceil(self.total / GALLERY_COLS)
+        self.canvas.configure(scrollregion=(0, 0, width, max(rows * ROW_H, 1)))
+
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        first = max(0, int(top // ROW_H) - GALLERY_MARGIN)
+        last = min(rows - 1, int(bottom // ROW_H) + GALLERY_MARGIN)
+        wanted = range(first * GALLERY_COLS, min(self.total, (last + 1) * GALLERY_COLS))
+
+        for index in [i for i in self.cards if i not in wanted]:
+            card = self.cards.pop(index)
+            self.canvas.itemconfigure(card.window, state="hidden")
+            self.free.append(card)
+
+        x0 = max(0, (width - GALLERY_COLS * CELL_W) // 2)
+        for index in wanted:
+            item = self.item(index)
+            if item is None: continue
+            card = self.cards.get(index)
+            if card is None:
+                card = self.free.pop() if self.free else GalleryCard(self.canvas, self.placeholder)
+                self.cards[index] = card
+            if card.path != item.get("path"): self.bind_card(card, item)
+            row, col = divmod(index, GALLERY_COLS)
+            self.canvas.coords(card.window, x0 + col * CELL_W + 10, row * ROW_H)
+            self.canvas.itemconfigure(card.window, state="normal")
+
+    def bind_card(self, card, item):
+        path = item.get("path")
+        card.path = path
+        name = os.path.basename(path or "")
+        if len(name) > 20: name = name[:20] + "..."
+        card.label.configure(text=name)
+        image = self.images.get(path)
+        if image is not None:
+            self.images.move_to_end(path)
+            card.btn.configure(image=image)
+            return
+        card.btn.configure(image=self.placeholder)
+        if path not in self.pending:
+            self.pending.add(path)
+            self.decode_requests.put(path)
+            if self.poll_job is None: self.poll_job = self.after(30, self.poll_decoded)
+
+    # --- background decoding ---
+    def decoder(self):
+        while True:
+            path = self.decode_requests.get()
+            if not any(c.path == path for c in list(self.cards.values())):
+                self.decoded.put((path, None, False))  # scrolled away before we got to it
+                continue
+            try:
+                pil_img = self.controller.thumbnails.load(path) if os.path.exists(path) else None
+            except Exception as e:
+                print(f"Gallery Error: {e}")
+                pil_img = None
+            self.decoded.put((path, pil_img, True))
+
+    def poll_decoded(self):
+        while True:
+            try: path, pil_img, done = self.decoded.get_nowait()
+            except queue.Empty: break
+            self.pending.discard(path)
+            if not done or pil_img is None: continue
+            scale = min(CARD_W / pil_img.width, THUMB_H / pil_img.height)
+            image = ctk.CTkImage(pil_img, size=(max(1, int(pil_img.width * scale)), max(1, int(pil_img.height * scale))))
+            self.images[path] = image
+            while len(self.images) > GALLERY_IMAGES: self.images.popitem(last=False)
+            for card in self.cards.values():
+                if card.path == path: card.btn.configure(image=image)
+        self.poll_job = self.after(30, self.poll_decoded) if self.pending else None
 
 if __name__ == "__main__":
     app = App()
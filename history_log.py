@@ -0,0 +1,82 @@
+import os
+import json
+import threading
+
+HISTORY_LOG_FILE = "history.jsonl"
+LEGACY_HISTORY_FILE = "history.json"
+
+class HistoryLog:
+    """Processed-file history as an append-only JSON-lines file.
+
+    Each event is one fsync'd line, so recording a rename costs the same no
+    matter how long the history is, and opening the log only looks at its
+    last bytes. Entries are streamed from disk on demand. Every line is a
+    real event (a name can be reused by a later file), so nothing is ever
+    rewritten; a line torn by a crash is cut off when the log is opened."""
+
+    def __init__(self, path=HISTORY_LOG_FILE, legacy_path=LEGACY_HISTORY_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+
+        if not os.path.exists(self.path) and os.path.exists(legacy_path):
+            self.migrate(legacy_path)
+        self.repair()
+
+    def migrate(self, legacy_path):
+        # One-time import of the old history.json list; the old file is left as it was.
+        try:
+            with open(legacy_path, 'r') as f: entries = json.load(f)
+        except: entries = []
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for entry in entries:
+                if isinstance(entry, dict): f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        print(f"Migrated {len(entries)} history entries to {self.path}")
+
+    def repair(self):
+        # A crash mid-write leaves a last line without its newline; cut it off
+        # so the next append starts on a line of its own.
+        if not os.path.exists(self.path): return
+        with open(self.path, 'rb+') as f:
+            end = f.seek(0, os.SEEK_END)
+            pos = end
+            while pos > 0:
+                step = min(4096, pos)
+                f.seek(pos - step)
+                chunk = f.read(step)
+                i = chunk.rfind(b"\n")
+                if i != -1:
+                    pos = pos - step + i + 1
+                    break
+                pos -= step
+            if pos == end: return
+            f.seek(pos)
+            try:
+                json.loads(f.read().decode('utf-8'))
+                f.write(b"\n")  # complete entry, only the newline is missing
+            except ValueError:
+                print(f"History: dropped a torn last line ({end - pos} bytes)")
+                f.truncate(pos)
+
+    def iter_entries(self):
+        """Every entry, oldest first, read from disk."""
+        if not os.path.exists(self.path): return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try: entry = json.loads(line)
+                except: continue  # torn write from a crash
+                if isinstance(entry, dict): yield entry
+
+    def append(self, entry):
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def empty(self):
+        return not os.path.exists(self.path) or os.path.getsize(self.path) == 0
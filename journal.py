@@ -0,0 +1,130 @@
+import os
+import json
+import uuid
+import threading
+
+JOURNAL_FILE = "jobs.jsonl"
+# A job's steps in order; each is written (and fsync'd) as soon as it has happened.
+STATES = ("detected", "analyzed", "renamed", "sorted")
+FINAL_STATES = ("done", "failed")
+
+class JobJournal:
+    """Write-ahead log of the files being processed.
+
+    Every step of a job is one fsync'd JSON line holding what changed:
+    detected (original name), analyzed (content hash and the model's
+    answer), renamed (new path), sorted (final path), then done or failed.
+    Replaying the file gives the last completed step of every unfinished
+    job, so a restart picks each one up from there instead of asking the
+    model again. Finished jobs are dropped when the file is compacted,
+    which keeps it as small as the work in flight.
+
+    Jobs are looked up by the file's current path; a path that already has
+    a job is in flight, and begin() refuses it."""
+
+    def __init__(self, path=JOURNAL_FILE, compact_every=200):
+        self.path = path
+        self.lock = threading.Lock()
+        self.jobs = {}    # current path -> merged record, unfinished jobs only
+        self.owners = {}  # current path -> handler working on it, in this process
+        self.compact_every = compact_every
+        self.finished = 0
+        self.load()
+        self.compact()
+
+    def load(self):
+        if not os.path.exists(self.path): return
+        merged = {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try: record = json.loads(line)
+                except: continue  # torn write from a crash
+                if not isinstance(record, dict) or "job" not in record: continue
+                if record.get("state") in FINAL_STATES: merged.pop(record["job"], None)
+                else: merged.setdefault(record["job"], {}).update(record)
+        self.jobs = {job["path"]: job for job in merged.values() if job.get("path")}
+
+    def compact(self):
+        # Rewrite with one merged line per unfinished job. Callers hold the lock (or are __init__).
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for job in self.jobs.values(): f.write(json.dumps(job, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.finished = 0
+
+    def write(self, record):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def begin(self, path, owner=None, **fields):
+        """Start a job for a newly detected file. False if that file already has one."""
+        with self.lock:
+            if path in self.jobs: return False
+            record = dict(fields, job=uuid.uuid4().hex[:12], state="detected", path=path)
+            self.write(record)
+            self.jobs[path] = record
+            self.owners[path] = owner
+            return True
+
+    def advance(self, current, state, **fields):
+        """Record that a step of the job at `current` is done. A `path` field moves
+        the job to its new path (rename, move)."""
+        with self.lock:
+            job = self.jobs.get(current)
+            if job is None: return
+            record = dict(fields, job=job["job"], state=state)
+            self.write(record)
+            job.update(record)
+            if job["path"] != current:
+                self.jobs[job["path"]] = self.jobs.pop(current)
+                self.owners[job["path"]] = self.owners.pop(current, None)
+
+    def finish(self, path, state="done"):
+        with self.lock:
+            job = self.jobs.pop(path, None)
+            self.owners.pop(path, None)
+            if job is None: return
+            self.write({"job": job["job"], "state": state})
+            self.finished += 1
+            if self.finished >= self.compact_every:
+                try: self.compact()
+                except Exception as e: print(f"Journal Compact Error: {e}")
+
+    def fail(self, path):
+        self.finish(path, "failed")
+
+    def get(self, path):
+        with self.lock:
+            job = self.jobs.get(path)
+            return dict(job) if job else None
+
+    def claim(self, owner):
+        """Unfinished jobs nobody in this process is working on (left by a crash or a stopped handler)."""
+        with self.lock:
+            jobs = [dict(job) for path, job in self.jobs.items() if self.owners.get(path) is None]
+            for job in jobs: self.owners[job["path"]] = owner
+            return jobs
+
+    def release(self, owner):
+        with self.lock:
+            for path, o in list(self.owners.items()):
+                if o is owner: self.owners[path] = None
+
+    def __len__(self):
+        with self.lock: return len(self.jobs)
+
+_lock = threading.Lock()
+_journal = None
+
+def get_journal(path=JOURNAL_FILE):
+    """Process-wide journal, shared by the watcher and backfill handlers so one
+    can't pick up a file the other is already working on."""
+    global _journal
+    with _lock:
+        if _journal is None or _journal.path != path:
+            _journal = JobJournal(path)
+        return _journal
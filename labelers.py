@@ -0,0 +1,286 @@
+import json
+import time
+import random
+import asyncio
+import hashlib
+import client_pool
+import preprocess
+import rate_limit
+import metrics
+
+LABELERS = ("gemini", "fake")
+DEFAULT_LABELER = "gemini"
+
+def extract_json(text):
+    try:
+        text = text.strip()
+        start = text.find('{')
+        end = text.rfind('}')
+        if start != -1 and end != -1:
+            return json.loads(text[start:end+1])
+        return json.loads(text)
+    except: return None
+
+def extract_json_array(text):
+    try:
+        text = text.strip()
+        start = text.find('[')
+        end = text.rfind(']')
+        if start != -1 and end != -1:
+            return json.loads(text[start:end+1])
+        return json.loads(text)
+    except: return None
+
+class Cancelled(Exception):
+    """The handler was stopped before the request went out."""
+
+class Labeler:
+    """Suggests {"filename", "folder"} for images.
+
+    analyze() takes one or more paths and returns one dict (or None when
+    there's no usable answer) per path, in order. Request-level failures
+    (quota, auth, network) are raised. analyze_async() is the same for the
+    async engine. `model` names the answers for caches and history."""
+
+    model = None
+    # Set by the handler; once set, requests not yet sent raise Cancelled.
+    cancelled = None
+    # Seconds per request attempt on the async path (None: no limit).
+    timeout = None
+
+    def __init__(self, folders):
+        self.folders = folders
+
+    def check_cancelled(self):
+        if self.cancelled is not None and self.cancelled.is_set(): raise Cancelled()
+
+    async def attempt(self, coro):
+        # Per attempt, so rate-limit waits and backoff between retries don't count against it.
+        return await asyncio.wait_for(coro, self.timeout)
+
+    def analyze(self, file_paths):
+        raise NotImplementedError
+
+    async def analyze_async(self, file_paths):
+        return await asyncio.to_thread(self.analyze, file_paths)
+
+class GeminiLabeler(Labeler):
+    def __init__(self, config, folders, limiter=None, timeout=None):
+        super().__init__(folders)
+        self.config = config
+        self.api_key = config.get("api_key")
+        self.model = config.get("model")
+        self.limiter = limiter or rate_limit.RateLimiter(0, 0, 0)
+        self.timeout = timeout
+
+    def folders_prompt(self):
+        folder_info = [f"{f['name']} (Description: {f.get('description', '')})" for f in self.folders]
+        if folder_info:
+            return f"Match with one of these folders if appropriate based on name and description: {'; '.join(folder_info)}."
+        return "No specific folders."
+
+    def upload_part(self, file_path):
+        with metrics.timer("preprocess"):
+            data, mime_type, info = preprocess.prepare_image(
+                file_path,
+                max_side=self.config.get("upload_max_side", preprocess.DEFAULT_MAX_SIDE),
+                fmt=self.config.get("upload_format", preprocess.DEFAULT_FORMAT),
+                quality=self.config.get("upload_quality", preprocess.DEFAULT_QUALITY))
+        metrics.inc("bytes_uploaded", info["upload_bytes"])
+        return client_pool.image_part(data, mime_type), info
+
+    def build_request(self, file_paths):
+        """Prompt and image parts for one request.
+        Returns (contents, paths that made it in, preprocess infos)."""
+        parts, infos, ok = [], [], []
+        for file_path in file_paths:
+            try:
+                part, info = self.upload_part(file_path)
+            except Exception as e:
+                print(f"Preprocess Error: {e}")
+                continue
+            if len(file_paths) > 1: parts.append(f"Image {len(ok) + 1}:")
+            parts.append(part)
+            infos.append(info)
+            ok.append(file_path)
+
+        if len(ok) == 1 and len(file_paths) == 1:
+            prompt = (
+                f"Analyze this image. Provide a JSON object with two keys:\n"
+                f"1. 'filename': A short, descriptive filename (2-5 words), using underscores instead of spaces. No extension.\n"
+                f"2. 'folder': The exact name of the matching folder from the list below, or null if no match.\n"
+                f"{self.folders_prompt()}\n"
+                f"Respond ONLY with valid JSON."
+            )
+        else:
+            prompt = (
+                f"Analyze each of the following {len(ok)} images. Respond ONLY with a valid JSON array of exactly "
+                f"{len(ok)} objects, one per image in the same order, each with two keys:\n"
+                f"1. 'filename': A short, descriptive filename (2-5 words), using underscores instead of spaces. No extension.\n"
+                f"2. 'folder': The exact name of the matching folder from the list below, or null if no match.\n"
+                f"{self.folders_prompt()}"
+            )
+        return [prompt] + parts, ok, infos
+
+    def parse_reply(self, text, count, batched):
+        if not text: return None
+        if not batched:
+            result = extract_json(text)
+            return [result] if isinstance(result, dict) else None
+        results = extract_json_array(text)
+        if not isinstance(results, list) or len(results) != count or not all(isinstance(r, dict) for r in results):
+            return None
+        return results
+
+    def estimate_tokens(self, contents, infos):
+        return rate_limit.estimate_tokens(contents[0], [info["size"] for info in infos])
+
+    def analyze(self, file_paths):
+        """One request for all file_paths; a batch reply that doesn't line up is retried one by one."""
+        contents, ok, infos = self.build_request(file_paths)
+        if not ok: return [None] * len(file_paths)
+        batched = len(file_paths) > 1
+        client = client_pool.get_client(self.api_key)
+        elapsed = []  # per attempt; rate-limit waits and backoff between retries aren't in it
+        def request():
+            self.check_cancelled()  # may have waited out the rate limit since STOP
+            metrics.inc("requests")
+            with metrics.timer("api"):
+                start = time.perf_counter()
+                response = client.models.generate_content(model=self.model, contents=contents)
+                elapsed.append(time.perf_counter() - start)
+                return response
+        response = self.limiter.call(request, self.estimate_tokens(contents, infos))
+        for file_path, info in zip(ok, infos):
+            print(preprocess.format_report(file_path, info, elapsed[-1], len(ok)))
+        with metrics.timer("parse"):
+            batch = self.parse_reply(response.text, len(ok), batched)
+        if batch is None and batched:
+            print(f"Batch of {len(ok)} didn't parse, retrying one by one")
+            batch = [self.analyze([p])[0] for p in ok]
+        results = dict(zip(ok, batch or []))
+        return [results.get(p) for p in file_paths]
+
+    async def analyze_async(self, file_paths):
+        contents, ok, infos = await asyncio.to_thread(self.build_request, file_paths)
+        if not ok: return [None] * len(file_paths)
+        batched = len(file_paths) > 1
+        client = client_pool.get_client(self.api_key)
+        elapsed = []
+        async def request():
+            self.check_cancelled()
+            metrics.inc("requests")
+            with metrics.timer("api"):
+                start = time.perf_counter()
+                response = await self.attempt(client.aio.models.generate_content(model=self.model, contents=contents))
+                elapsed.append(time.perf_counter() - start)
+                return response
+        response = await self.limiter.call_async(request, self.estimate_tokens(contents, infos))
+        for file_path, info in zip(ok, infos):
+            print(preprocess.format_report(file_path, info, elapsed[-1], len(ok)))
+        with metrics.timer("parse"):
+            batch = self.parse_reply(response.text, len(ok), batched)
+        if batch is None and batched:
+            print(f"Batch of {len(ok)} didn't parse, retrying one by one")
+            singles = await asyncio.gather(*(self.analyze_async([p]) for p in ok), return_exceptions=True)
+            batch = [r[0] if isinstance(r, list) else None for r in singles]
+        results = dict(zip(ok, batch or []))
+        return [results.get(p) for p in file_paths]
+
+class FakeError(Exception):
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+FAKE_WORDS = ("red", "blue", "green", "small", "large", "old", "new", "dark", "bright", "happy",
+              "cat", "dog", "car", "tree", "house", "chart", "code", "window", "menu", "portrait",
+              "screen", "error", "dialog", "map", "photo", "receipt", "table", "graph", "logo", "page")
+
+FAKE_ERRORS = {429: "RESOURCE_EXHAUSTED. Please retry in 1s.", 500: "INTERNAL", 503: "UNAVAILABLE"}
+
+class FakeLabeler(Labeler):
+    """Offline stand-in for load tests and benchmarks; no network, no quota.
+
+    Answers depend only on the file bytes (and seed): the name is picked from
+    a word list by content hash and the folder is one of the smart folders,
+    or none. Each request sleeps for a log-normal latency around latency_ms
+    per request plus per_image_ms per image, and fails with probability
+    errors[code] ("bad_json" gives no answers, like an unparsable reply).
+    Errors go through the limiter like real ones, so retries get exercised."""
+
+    model = "fake"
+
+    def __init__(self, folders, latency_ms=800, per_image_ms=50, jitter=0.3, errors=None, folder_rate=0.7,
+                 seed=0, limiter=None, timeout=None):
+        super().__init__(folders)
+        self.latency_ms = latency_ms
+        self.per_image_ms = per_image_ms
+        self.jitter = jitter
+        self.errors = errors or {}
+        self.folder_rate = folder_rate
+        self.seed = seed
+        self.limiter = limiter or rate_limit.RateLimiter(0, 0)
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+
+    def label(self, file_path):
+        h = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''): h.update(chunk)
+        h.update(str(self.seed).encode())
+        rng = random.Random(h.digest())
+        filename = "_".join(rng.choice(FAKE_WORDS) for _ in range(rng.randint(2, 4)))
+        folder = None
+        if self.folders and rng.random() < self.folder_rate: folder = rng.choice(self.folders)["name"]
+        return {"filename": filename, "folder": folder}
+
+    def outcome(self, count):
+        """(latency in seconds, error code or None) for one request."""
+        latency = (self.latency_ms + self.per_image_ms * count) / 1000 * self.rng.lognormvariate(0, self.jitter)
+        roll = self.rng.random()
+        for code, p in self.errors.items():
+            if roll < p: return latency, code
+            roll -= p
+        return latency, None
+
+    def reply(self, file_paths, error):
+        if error == "bad_json": return [None] * len(file_paths)
+        if error is not None:
+            code = int(error)
+            raise FakeError(code, FAKE_ERRORS.get(code, "ERROR"))
+        results = []
+        for p in file_paths:
+            try: results.append(self.label(p))
+            except OSError: results.append(None)
+        return results
+
+    def analyze(self, file_paths):
+        def request():
+            self.check_cancelled()
+            metrics.inc("requests")
+            latency, error = self.outcome(len(file_paths))
+            with metrics.timer("api"): time.sleep(latency)
+            return self.reply(file_paths, error)
+        return self.limiter.call(request)
+
+    async def analyze_async(self, file_paths):
+        async def request():
+            self.check_cancelled()
+            metrics.inc("requests")
+            latency, error = self.outcome(len(file_paths))
+            with metrics.timer("api"): await self.attempt(asyncio.sleep(latency))
+            return self.reply(file_paths, error)
+        return await self.limiter.call_async(request)
+
+def make_labeler(config, folders, limiter=None, timeout=None):
+    """Labeler selected by config["labeler"]; "fake" takes its settings from config["fake_labeler"]."""
+    kind = config.get("labeler", DEFAULT_LABELER)
+    if kind == "fake":
+        settings = dict(config.get("fake_labeler") or {})
+        # Its own limiter: no budget unless the fake sets one, but the same retries.
+        settings["limiter"] = rate_limit.RateLimiter(settings.pop("rpm", 0), settings.pop("tpm", 0),
+                                                     config.get("max_retries", rate_limit.DEFAULT_MAX_RETRIES))
+        settings.setdefault("timeout", timeout)
+        return FakeLabeler(folders, **settings)
+    if kind != "gemini": print(f"Unknown labeler '{kind}', using gemini")
+    return GeminiLabeler(config, folders, limiter, timeout)
@@ -0,0 +1,126 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = "ai_renamer"
+DEFAULT_PORT = 9464
+# Seconds; roughly x2.5 steps from 1ms to 2 minutes covers a stat call up to a throttled request.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 60, 120)
+
+# Stages of one file, in pipeline order.
+STAGES = ("detect", "wait", "verify", "preprocess", "rate_limit", "api", "parse", "rename", "sort", "total")
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate from the buckets, interpolating linearly inside one (as Prometheus does)."""
+        if not self.count: return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lower = self.buckets[i - 1] if i else 0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+class Metrics:
+    """Stage timings (histograms) and counters for one process.
+
+    Everything is cheap enough to record on every file; the GUI reads
+    snapshot() and the /metrics endpoint renders prometheus()."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.server = None
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            h = self.histograms.get(stage)
+            if h is None: h = self.histograms[stage] = Histogram()
+            h.observe(max(0.0, seconds))
+
+    def inc(self, name, amount=1):
+        with self.lock: self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try: yield
+        finally: self.observe(stage, time.perf_counter() - start)
+
+    def snapshot(self):
+        """{"stages": {stage: {"count", "p50", "p95", "p99", "mean"}}, "counters": {...}}"""
+        with self.lock:
+            stages = {name: {"count": h.count, "p50": h.quantile(0.5), "p95": h.quantile(0.95), "p99": h.quantile(0.99),
+                             "mean": h.sum / h.count if h.count else None}
+                      for name, h in self.histograms.items()}
+            return {"stages": stages, "counters": dict(self.counters)}
+
+    def prometheus(self):
+        lines = [f"# HELP {PREFIX}_stage_seconds Time spent per file in each processing stage.",
+                 f"# TYPE {PREFIX}_stage_seconds histogram"]
+        with self.lock:
+            for stage, h in sorted(self.histograms.items()):
+                cumulative = 0
+                for le, n in zip(h.buckets + ("+Inf",), h.counts):
+                    cumulative += n
+                    lines.append(f'{PREFIX}_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{PREFIX}_stage_seconds_sum{{stage="{stage}"}} {h.sum}')
+                lines.append(f'{PREFIX}_stage_seconds_count{{stage="{stage}"}} {h.count}')
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+                lines.append(f"{PREFIX}_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port=DEFAULT_PORT, host="127.0.0.1"):
+        """Serve GET /metrics on a background thread. Only local by default; no-op if already running."""
+        if self.server or not port: return
+        metrics = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            def log_message(self, *args): pass
+        try:
+            self.server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            print(f"Metrics Error: can't listen on {host}:{port}: {e}")
+            return
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True).start()
+        print(f"Metrics at http://{host}:{port}/metrics")
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+# One registry per process, like the client and the rate limiter.
+METRICS = Metrics()
+observe = METRICS.observe
+inc = METRICS.inc
+timer = METRICS.timer
@@ -0,0 +1,155 @@
+import io
+import os
+import json
+import time
+import hashlib
+import threading
+from PIL import Image, ImageDraw
+import client_pool
+import labelers
+
+MODEL_CACHE_FILE = "model_choice.json"
+DEFAULT_TTL = 24 * 3600
+DEFAULT_MODEL = "gemini-2.5-flash"
+# Tried in this order when nothing has been measured; also the candidates for probing.
+PRIORITIES = ("gemini-2.5-flash", "gemini-2.5-flash-lite", "gemini-2.0-flash", "gemini-2.0-flash-lite", "gemini-2.5-pro")
+# generateContent models that don't take an image and answer in text.
+SKIP_WORDS = ("embedding", "tts", "image", "audio", "live")
+PROBE_PROMPT = ('Describe this image. Respond ONLY with valid JSON: {"filename": "<2-5 words with underscores>", '
+                '"folder": null}')
+
+def key_id(api_key):
+    # Which key the choice was made for, without writing the key itself to disk.
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:12]
+
+def short_name(name):
+    return name.split("/")[-1]
+
+def list_models(client):
+    """Short names of the Gemini models this key can call generateContent on."""
+    names = []
+    for model in client.models.list():
+        name = short_name(model.name or "")
+        if "gemini" not in name or any(w in name for w in SKIP_WORDS): continue
+        actions = model.supported_actions or []
+        if actions and "generateContent" not in actions: continue
+        names.append(name)
+    return names
+
+def by_priority(available):
+    for name in PRIORITIES:
+        if name in available: return name
+    return available[0] if available else None
+
+_probe_image = None
+
+def probe_image():
+    """Small fixed PNG: a few shapes and a word, enough for a real answer."""
+    global _probe_image
+    if _probe_image is None:
+        img = Image.new("RGB", (96, 64), (245, 245, 245))
+        draw = ImageDraw.Draw(img)
+        draw.rectangle((8, 8, 40, 40), fill=(220, 40, 40))
+        draw.ellipse((52, 12, 84, 44), fill=(40, 90, 220))
+        draw.text((8, 48), "probe", fill=(0, 0, 0))
+        buf = io.BytesIO()
+        img.save(buf, "PNG")
+        _probe_image = buf.getvalue()
+    return _probe_image
+
+def probe(client, model, limiter=None, rounds=2):
+    """Best request latency in seconds for model over `rounds` tries, or None if it never gave valid JSON."""
+    contents = [PROBE_PROMPT, client_pool.image_part(probe_image(), "image/png")]
+    best = None
+    for _ in range(rounds):
+        elapsed = []
+        def request():
+            start = time.perf_counter()
+            response = client.models.generate_content(model=model, contents=contents)
+            elapsed.append(time.perf_counter() - start)
+            return response
+        try:
+            response = limiter.call(request) if limiter else request()
+        except Exception as e:
+            print(f"Probe Error: {model}: {e}")
+            return None
+        result = labelers.extract_json(response.text or "")
+        if not isinstance(result, dict) or not result.get("filename"): return None
+        best = elapsed[-1] if best is None else min(best, elapsed[-1])
+    return best
+
+def choose(client, probe_latency=False, limiter=None):
+    """Fresh choice: {"model", "available", "latencies", "probed"}. Costs one list call, plus
+    `rounds` small requests per candidate when probing."""
+    available = list_models(client)
+    choice = {"model": by_priority(available), "available": available, "latencies": {}, "probed": probe_latency}
+    if probe_latency:
+        for name in [p for p in PRIORITIES if p in available]:
+            latency = probe(client, name, limiter)
+            print(f"Probe: {name} " + (f"{latency * 1000:.0f} ms" if latency is not None else "failed"))
+            if latency is not None: choice["latencies"][name] = latency
+        if choice["latencies"]:
+            choice["model"] = min(choice["latencies"], key=choice["latencies"].get)
+    return choice
+
+def load_choice(path=MODEL_CACHE_FILE):
+    try:
+        with open(path, 'r') as f: return json.load(f)
+    except: return None
+
+def save_choice(choice, path=MODEL_CACHE_FILE):
+    tmp = path + ".tmp"
+    with open(tmp, 'w') as f: json.dump(choice, f, indent=2)
+    os.replace(tmp, path)
+
+class ModelSelector:
+    """Model choice cached in model_choice.json for `ttl` seconds.
+
+    select() answers from the cache when there is one for this key, so a
+    normal start makes no list call. Once the entry is older than ttl the
+    cached model is still returned right away and a background thread makes
+    a new choice, saves it and reports it through on_change. Only the very
+    first start (or a new key) chooses synchronously."""
+
+    def __init__(self, client, api_key, ttl=DEFAULT_TTL, probe=False, limiter=None, path=MODEL_CACHE_FILE,
+                 on_change=None):
+        self.client = client
+        self.key_id = key_id(api_key)
+        self.ttl = ttl
+        self.probe = probe
+        self.limiter = limiter
+        self.path = path
+        self.on_change = on_change
+        self.refreshing = None
+
+    def select(self, force=False):
+        cached = load_choice(self.path)
+        usable = (cached and cached.get("key_id") == self.key_id and cached.get("model")
+                  and (cached.get("probed") or not self.probe))
+        if usable and not force:
+            if time.time() - cached.get("checked_at", 0) >= self.ttl: self.refresh_in_background(cached["model"])
+            return cached["model"]
+        choice = self.refresh()
+        if choice and choice["model"]: return choice["model"]
+        return cached["model"] if usable else DEFAULT_MODEL
+
+    def refresh(self):
+        try:
+            choice = choose(self.client, self.probe, self.limiter)
+        except Exception as e:
+            print(f"Model Select Error: {e}")
+            return None
+        if not choice["model"]: return choice
+        choice.update(key_id=self.key_id, checked_at=time.time())
+        try: save_choice(choice, self.path)
+        except Exception as e: print(f"Model Cache Save Error: {e}")
+        return choice
+
+    def refresh_in_background(self, current):
+        if self.refreshing and self.refreshing.is_alive(): return
+        def run():
+            choice = self.refresh()
+            if choice and choice["model"] and choice["model"] != current and self.on_change:
+                self.on_change(choice["model"])
+        self.refreshing = threading.Thread(target=run, name="model-select", daemon=True)
+        self.refreshing.start()
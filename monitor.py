@@ -1,28 +1,60 @@
 import sys
 import time
 import os
+import json
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-from google import genai
-from PIL import Image
+import client_pool
+import rate_limit
+import labelers
+import model_select
+from readiness import wait_until_ready
+from name_allocator import get_allocator
 
 # Global variable to store the selected model name
 SELECTED_MODEL = None
+# Backend that names images, set up at startup
+LABELER = None
+
+def load_settings():
+    """labeler / fake_labeler / rate limit settings from app_config.json, if there is one."""
+    try:
+        with open(client_pool.APP_CONFIG_FILE, 'r') as f:
+            return json.load(f)
+    except Exception:
+        return {}
 
 class ScreenshotHandler(FileSystemEventHandler):
+    def __init__(self):
+        self.names = get_allocator()
+
     def on_created(self, event):
         if event.is_directory:
             return
         
         filename = event.src_path
+        if self.names.ours(filename):
+            return  # our own rename
+        self.names.added(filename)
         ext = os.path.splitext(filename)[1].lower()
         
         if ext in ['.png', '.jpg', '.jpeg']:
             print(f"[EVENT] New file detected: {os.path.basename(filename)}")
-            # Wait a moment for the file to be fully written/released
-            time.sleep(2)
+            # Wait until the file stops changing (fully written/released)
+            if not wait_until_ready(filename):
+                print(f"[ERROR] File never finished writing: {os.path.basename(filename)}")
+                return
             self.process_image(filename)
 
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self.names.removed(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.names.removed(event.src_path)
+            self.names.added(event.dest_path)
+
     def process_image(self, file_path):
         try:
             # Analyze image
@@ -36,37 +68,21 @@ class ScreenshotHandler(FileSystemEventHandler):
             print(f"[ERROR] Failed to process image: {e}")
 
     def get_image_label(self, file_path):
-        """Uses Google Gen AI SDK to describe the image."""
-        global SELECTED_MODEL
-        if not SELECTED_MODEL:
+        """Asks the configured labeler (Gemini, or the offline fake) to name the image."""
+        if LABELER is None:
             print("[ERROR] No valid model selected.")
             return None
             
         try:
-            client = genai.Client(api_key=os.environ["GOOGLE_API_KEY"])
-            
-            # Load the image
-            img = Image.open(file_path)
-            
-            # Prompt for the model
-            prompt = "Analyze this image and provide a short, descriptive filename (2-5 words). Use only alphanumeric characters, spaces, or underscores. Do not include the file extension. Be specific but concise."
-            
-            response = client.models.generate_content(
-                model=SELECTED_MODEL,
-                contents=[prompt, img]
-            )
-            
-            if response.text:
-                return response.text.strip()
+            result = LABELER.analyze([file_path])[0]
+            if result and result.get("filename"):
+                return result["filename"].strip()
             return None
         except Exception as e:
             print(f"[API ERROR] {e}")
             return None
 
     def rename_file(self, file_path, label):
-        directory = os.path.dirname(file_path)
-        ext = os.path.splitext(file_path)[1]
-        
         # Sanitize label for filename
         safe_label = "".join([c for c in label if c.isalnum() or c in (' ', '-', '_')]).strip()
         safe_label = safe_label.replace(' ', '_')
@@ -75,84 +91,42 @@ class ScreenshotHandler(FileSystemEventHandler):
         if len(safe_label) > 50:
             safe_label = safe_label[:50]
             
-        new_name = f"{safe_label}{ext}"
-        new_path = os.path.join(directory, new_name)
-        
-        # Handle duplicates
-        counter = 1
-        while os.path.exists(new_path):
-            new_name = f"{safe_label}_{counter}{ext}"
-            new_path = os.path.join(directory, new_name)
-            counter += 1
-            
+        # Duplicates get the next free _N suffix
         try:
-            os.rename(file_path, new_path)
-            print(f"[SUCCESS] Renamed to: {new_name}")
+            new_path = self.names.rename(file_path, safe_label)
+            print(f"[SUCCESS] Renamed to: {os.path.basename(new_path)}")
         except Exception as e:
             print(f"[ERROR] Could not rename file: {e}")
 
-def select_model():
-    """Dynamically selects a supported model."""
+def select_model(settings=None, probe=False, limiter=None):
+    """Model from model_choice.json, refreshed in the background once it's older than
+    model_cache_ttl. With probe (--probe or model_probe), candidates are timed with a
+    tiny request and the fastest one that answers with valid JSON wins."""
     global SELECTED_MODEL
-    try:
-        print("Finding available models...")
-        client = genai.Client(api_key=os.environ["GOOGLE_API_KEY"])
-        
-        available_models = []
-        for model in client.models.list():
-            # Debug: print first model attributes to help diagnose if needed
-            if not available_models: 
-                print(f"[DEBUG] First model object keys: {dir(model)}")
-            
-            # Try to determine if it supports generation using multiple attribute names
-            supports_gen = False
-            methods = getattr(model, 'supported_generation_methods', [])
-            if not methods:
-                methods = getattr(model, 'supportedGenerationMethods', [])
-            
-            if methods and "generateContent" in methods:
-                supports_gen = True
-            
-            # Heuristic: if it has 'gemini' in the name, it's likely a gen model
-            if "gemini" in model.name:
-                supports_gen = True
-                
-            if supports_gen:
-                print(f"[DEBUG] Found candidate: {model.name}")
-                available_models.append(model.name)
-        
-        # Priorities (try these first)
-        priorities = [
-            'gemini-1.5-flash', 
-            'gemini-1.5-flash-001',
-            'gemini-2.0-flash-exp',
-            'gemini-1.5-pro',
-            'gemini-1.0-pro'
-        ]
-        
-        for priority in priorities:
-            for m in available_models:
-                # m usually looks like "models/gemini-1.5-flash"
-                if m == priority or m == f"models/{priority}" or m.endswith(f"/{priority}"):
-                    SELECTED_MODEL = m.replace('models/', '') # SDK often wants the short name
-                    print(f"[INFO] Selected model: {SELECTED_MODEL}")
-                    return
-
-        if available_models:
-            SELECTED_MODEL = available_models[0].replace('models/', '')
-            print(f"[INFO] Fallback model selected: {SELECTED_MODEL}")
-        else:
-            print("[ERROR] No models found. Using default fallback.")
-            SELECTED_MODEL = 'gemini-1.5-flash'
-
-    except Exception as e:
-        print(f"[ERROR] Could not list models: {e}")
-        SELECTED_MODEL = 'gemini-1.5-flash'
-        print(f"[INFO] Defaulting to {SELECTED_MODEL}")
+    settings = settings or {}
+    api_key = os.environ["GOOGLE_API_KEY"]
+    def on_change(model):
+        global SELECTED_MODEL
+        print(f"[INFO] Switching to model: {model}")
+        SELECTED_MODEL = model
+        if LABELER is not None: LABELER.model = model
+    selector = model_select.ModelSelector(client_pool.get_client(api_key), api_key,
+                                          ttl=settings.get("model_cache_ttl", model_select.DEFAULT_TTL),
+                                          probe=probe or settings.get("model_probe", False),
+                                          limiter=limiter, on_change=on_change)
+    SELECTED_MODEL = selector.select(force=probe)
+    print(f"[INFO] Selected model: {SELECTED_MODEL}")
 
 if __name__ == "__main__":
+    settings = load_settings()
+    # Shared RPM/TPM budget; rate limits and server errors are retried with backoff
+    limiter = rate_limit.get_limiter(settings.get("rate_limit_rpm", rate_limit.DEFAULT_RPM),
+                                     settings.get("rate_limit_tpm", rate_limit.DEFAULT_TPM),
+                                     settings.get("max_retries", rate_limit.DEFAULT_MAX_RETRIES))
     # Check for credentials
-    if "GOOGLE_API_KEY" not in os.environ:
+    if settings.get("labeler") == "fake":
+        print("[INFO] Using the offline fake labeler")
+    elif "GOOGLE_API_KEY" not in os.environ:
         print("----------------------------------------------------------------")
         print("[WARNING] GOOGLE_API_KEY environment variable not set.")
         print("Please set it to your Google Generative AI API key.")
@@ -160,7 +134,11 @@ if __name__ == "__main__":
         print("Example (CMD): set GOOGLE_API_KEY=your_api_key")
         print("----------------------------------------------------------------")
     else:
-        select_model()
+        select_model(settings, probe="--probe" in sys.argv, limiter=limiter)
+    
+    if settings.get("labeler") == "fake" or SELECTED_MODEL:
+        LABELER = labelers.make_labeler(dict(settings, api_key=os.environ.get("GOOGLE_API_KEY"), model=SELECTED_MODEL),
+                                        [], limiter)
     
     path = r"c:\Users\user\Pictures\Screenshots"
     
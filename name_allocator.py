@@ -0,0 +1,119 @@
+import os
+import threading
+from collections import OrderedDict
+
+class _Directory:
+    def __init__(self, path):
+        self.taken = set()  # normcase'd names
+        self.next = {}      # normcase'd stem+ext -> next suffix to try
+        with os.scandir(path) as it:
+            for entry in it: self.taken.add(os.path.normcase(entry.name))
+
+class NameAllocator:
+    """Free "label.png", "label_1.png", ... names per directory without probing the disk.
+
+    A directory is listed once; after that the taken names live in a set and
+    the next suffix per label is remembered, so the thousandth man_portrait
+    costs the same as the first. Suffixes only move forward (gaps left by
+    deleted files are not refilled). Each name is claimed on disk atomically,
+    with a hard link (or a no-replace rename on Windows), so parallel workers
+    and other programs can't end up on the same name: if the name turns out
+    to exist it's marked taken and the next one is tried.
+
+    Watchers pass their events to added()/removed() to keep the index in
+    sync, and skip events for paths where ours() is true (our own renames)."""
+
+    def __init__(self, remember=1000):
+        self.lock = threading.Lock()
+        self.dirs = {}
+        self.claimed = OrderedDict()
+        self.remember = remember
+
+    def dir_key(self, path):
+        return os.path.normcase(os.path.abspath(path))
+
+    def directory(self, directory):
+        k = self.dir_key(directory)
+        d = self.dirs.get(k)
+        if d is None: d = self.dirs[k] = _Directory(directory)
+        return d
+
+    def candidate(self, d, stem, ext):
+        key = os.path.normcase(stem + ext)
+        n = d.next.get(key, 0)
+        while True:
+            name = f"{stem}_{n}{ext}" if n else f"{stem}{ext}"
+            n += 1
+            if os.path.normcase(name) not in d.taken:
+                d.next[key] = n
+                d.taken.add(os.path.normcase(name))
+                return name
+
+    def rename(self, file_path, stem):
+        """Renames file_path to the first free stem[_N]<ext> in its directory and returns the new path."""
+        directory = os.path.dirname(file_path)
+        ext = os.path.splitext(file_path)[1]
+        while True:
+            with self.lock:
+                d = self.directory(directory)
+                name = self.candidate(d, stem, ext)
+                new_path = os.path.join(directory, name)
+                # Before the claim, so the create event can never be seen first.
+                self.claimed[self.dir_key(new_path)] = True
+                while len(self.claimed) > self.remember: self.claimed.popitem(last=False)
+            try:
+                self.claim(file_path, new_path)
+            except FileExistsError:
+                continue  # taken by someone else; stays marked as taken
+            except Exception:
+                with self.lock:
+                    d.taken.discard(os.path.normcase(name))
+                    self.claimed.pop(self.dir_key(new_path), None)
+                raise
+            with self.lock: d.taken.discard(os.path.normcase(os.path.basename(file_path)))
+            return new_path
+
+    def claim(self, src, dst):
+        if os.name == 'nt':
+            os.rename(src, dst)  # fails instead of replacing on Windows
+            return
+        try:
+            os.link(src, dst)
+        except FileExistsError:
+            raise
+        except OSError:
+            # No hard links on this filesystem (e.g. FAT); fall back to a checked rename.
+            if os.path.lexists(dst): raise FileExistsError(dst)
+            os.rename(src, dst)
+            return
+        try:
+            os.unlink(src)
+        except OSError:
+            os.unlink(dst)
+            raise
+
+    def ours(self, path):
+        with self.lock: return self.dir_key(path) in self.claimed
+
+    def added(self, path):
+        with self.lock:
+            d = self.dirs.get(self.dir_key(os.path.dirname(path)))
+            if d is not None: d.taken.add(os.path.normcase(os.path.basename(path)))
+
+    def removed(self, path):
+        with self.lock:
+            self.claimed.pop(self.dir_key(path), None)
+            d = self.dirs.get(self.dir_key(os.path.dirname(path)))
+            if d is not None: d.taken.discard(os.path.normcase(os.path.basename(path)))
+
+_lock = threading.Lock()
+_allocator = None
+
+def get_allocator():
+    """Process-wide allocator. The watcher and backfill handlers share it, so the
+    watcher's ours() also knows the backfill's renames (a hard-link claim shows
+    up as a create event, not a move)."""
+    global _allocator
+    with _lock:
+        if _allocator is None: _allocator = NameAllocator()
+        return _allocator
@@ -0,0 +1,186 @@
+import os
+import json
+import base64
+import threading
+from collections import OrderedDict, deque
+from PIL import Image
+
+PHASH_INDEX_FILE = "phash_index.jsonl"
+DEFAULT_MAX_DISTANCE = 3
+DEFAULT_MAX_ENTRIES = 5000
+# A 9x8 (64-bit) hash can't tell two screenshots of the same app layout
+# apart; at 17x16 (256 bits) different text in the same editor is ~20 bits off.
+HASH_SIZE = 16
+HASH_BITS = HASH_SIZE * HASH_SIZE
+# Hash matches are confirmed on a small colour thumbnail before a label is reused.
+THUMB_SIZE = 32
+MAX_PIXEL_DIFF = 8
+
+def dhash_image(img, size=HASH_SIZE):
+    """Difference hash: compares neighbouring pixels of a (size+1)x(size) grayscale thumbnail."""
+    px = img.convert("L").resize((size + 1, size), Image.BILINEAR).tobytes()
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = px[row * (size + 1) + col]
+            right = px[row * (size + 1) + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+def dhash(file_path, size=HASH_SIZE):
+    return image_signature(file_path, size)[0]
+
+def image_signature(file_path, size=HASH_SIZE):
+    """(dhash, THUMB_SIZE x THUMB_SIZE RGB thumbnail bytes) from one decode."""
+    with Image.open(file_path) as img:
+        img.draft("RGB", (THUMB_SIZE * 4, THUMB_SIZE * 4))
+        img = img.convert("RGB")
+        return dhash_image(img, size), img.resize((THUMB_SIZE, THUMB_SIZE), Image.BOX).tobytes()
+
+def same_image(a, b, max_diff=MAX_PIXEL_DIFF):
+    """Every thumbnail pixel channel within max_diff: catches different text or colours
+    that the hash can miss, but lets re-encodes and resizes through."""
+    return len(a) == len(b) and max(abs(x - y) for x, y in zip(a, b)) <= max_diff
+
+class PHashIndex:
+    """Near-duplicate lookup by Hamming distance using multi-index hashing.
+
+    The hash is split into more chunks than max_distance, so any hash within
+    max_distance matches at least one chunk exactly (pigeonhole). A lookup
+    compares against the entries sharing a chunk; with wide chunks that is
+    few of them, but screenshots of one layout share chunks, so it degrades
+    toward a scan of those: about 1 ms at the default 5000 entries when all
+    are one layout, growing linearly with max_entries (4 ms at 20000).
+    Candidates within max_distance are then confirmed on their thumbnails,
+    closest first.
+
+    Only the newest max_entries are kept; the file is rewritten with just
+    those once it holds twice as many lines. With background=True the file
+    is read on a thread, and lookups before it finishes only see entries
+    added since."""
+
+    def __init__(self, path=PHASH_INDEX_FILE, max_distance=DEFAULT_MAX_DISTANCE, max_entries=DEFAULT_MAX_ENTRIES,
+                 background=False):
+        self.path = path
+        self.max_distance = max_distance
+        self.max_entries = max(1, int(max_entries))
+        self.chunks = next(c for c in (2, 4, 8, 16, 32, 64, 128, 256) if c > max_distance)
+        self.bits = HASH_BITS // self.chunks
+        self.mask = (1 << self.bits) - 1
+        self.lock = threading.Lock()       # entries and tables
+        self.file_lock = threading.Lock()  # appends and rewrites of the file
+        self.entries = OrderedDict()       # id -> (hash, entry), oldest first
+        self.tables = [{} for _ in range(self.chunks)]  # chunk value -> {id: hash}
+        self.next_id = 0
+        self.lines = 0
+        # Only what's in the file now is loaded; entries added meanwhile are appended past it.
+        self.loaded_size = os.path.getsize(path) if os.path.exists(path) else 0
+        if background: threading.Thread(target=self.load, name="phash-load", daemon=True).start()
+        else: self.load()
+
+    def load(self):
+        if not self.loaded_size: return
+        try:
+            with self.file_lock:
+                tail, size = deque(maxlen=self.max_entries), 0
+                with open(self.path, 'rb') as f:
+                    for line in f:
+                        size += len(line)
+                        if size > self.loaded_size: break
+                        tail.append(line)
+                        self.lines += 1
+        except Exception as e:
+            print(f"PHash Load Error: {e}")
+            return
+        loaded = []
+        for line in tail:
+            try: e = json.loads(line)
+            except: continue
+            # Entries from the old 64-bit hash (no thumbnail) can't be confirmed.
+            if len(e.get("hash", "")) != HASH_BITS // 4 or not e.get("thumb"): continue
+            e["thumb"] = base64.b64decode(e["thumb"])
+            loaded.append((int(e["hash"], 16), e))
+        with self.lock:
+            added = list(self.entries)  # while loading; they're newer than anything in the file
+            for value, e in loaded: self._insert(value, e)
+            for idx in added: self.entries.move_to_end(idx)
+            self._evict()
+        self.compact(2 * self.max_entries)
+
+    def _insert(self, value, entry):
+        idx = self.next_id
+        self.next_id += 1
+        self.entries[idx] = (value, entry)
+        for i in range(self.chunks):
+            self.tables[i].setdefault((value >> (i * self.bits)) & self.mask, {})[idx] = value
+
+    def _evict(self):
+        while len(self.entries) > self.max_entries:
+            idx, (value, _) = self.entries.popitem(last=False)
+            for i in range(self.chunks):
+                key = (value >> (i * self.bits)) & self.mask
+                ids = self.tables[i][key]
+                del ids[idx]
+                if not ids: del self.tables[i][key]
+
+    def find(self, value, thumb, signature=None):
+        """Closest entry within max_distance whose thumbnail also matches (optionally
+        with the same folder signature), or None."""
+        # Flat/blank images all hash to 0 and say nothing about each other.
+        if value == 0: return None
+        candidates = []
+        with self.lock:
+            hashes = {}  # id -> hash of every entry sharing a chunk, each once
+            for i, t in enumerate(self.tables): hashes.update(t.get((value >> (i * self.bits)) & self.mask, ()))
+            for idx, other in hashes.items():
+                dist = (value ^ other).bit_count()
+                if dist > self.max_distance: continue
+                entry = self.entries[idx][1]
+                if signature is None or entry.get("sig") == signature: candidates.append((dist, idx, entry))
+        for dist, _, entry in sorted(candidates, key=lambda c: c[:2]):
+            if same_image(thumb, entry["thumb"]): return entry
+        return None
+
+    def add(self, value, thumb, filename, folder, signature=None):
+        entry = {"hash": f"{value:0{HASH_BITS // 4}x}", "filename": filename, "folder": folder, "sig": signature,
+                 "thumb": thumb}
+        with self.file_lock:  # held across both, so a compaction has either neither or both
+            with self.lock:
+                self._insert(value, entry)
+                self._evict()
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f: f.write(self.line(entry))
+                self.lines += 1
+            except Exception as e: print(f"PHash Save Error: {e}")
+        self.compact(2 * self.max_entries)
+
+    def line(self, entry):
+        return json.dumps(dict(entry, thumb=base64.b64encode(entry["thumb"]).decode("ascii"))) + "\n"
+
+    def compact(self, limit=0):
+        """Rewrite the file with only the entries still kept, if it has more than limit lines."""
+        with self.file_lock:
+            if self.lines <= limit: return
+            with self.lock: entries = [entry for _, entry in self.entries.values()]
+            tmp = self.path + ".tmp"
+            try:
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    for entry in entries: f.write(self.line(entry))
+                os.replace(tmp, self.path)
+                self.lines = len(entries)
+            except Exception as e: print(f"PHash Compact Error: {e}")
+
+    def __len__(self): return len(self.entries)
+
+_lock = threading.Lock()
+_index = None
+
+def get_index(max_distance=DEFAULT_MAX_DISTANCE, max_entries=DEFAULT_MAX_ENTRIES, path=PHASH_INDEX_FILE):
+    """Process-wide index, shared by the watcher and backfill handlers so each sees
+    the labels the other adds. The file is read on a background thread."""
+    global _index
+    with _lock:
+        if _index is None or _index.path != path or _index.max_distance != max_distance:
+            _index = PHashIndex(path, max_distance, max_entries, background=True)
+        _index.max_entries = max(1, int(max_entries))
+        return _index
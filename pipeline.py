@@ -0,0 +1,135 @@
+import asyncio
+import queue
+import threading
+import time
+import traceback
+
+_STOP = object()
+
+class Stage:
+    def __init__(self, name, func, workers=1, queue_size=0, batch_size=None, batch_wait=0):
+        self.name = name
+        self.func = func
+        # Batched stages get a list of up to batch_size items and return a list.
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.workers = max(1, int(workers))
+        self.queue = queue.Queue(maxsize=max(0, int(queue_size)))
+        self.next = None
+        self.threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self.run, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def collect(self, first):
+        # Take whatever else arrives within batch_wait, up to batch_size.
+        items = [first]
+        deadline = time.monotonic() + self.batch_wait
+        while len(items) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self.queue.put(_STOP)  # leave it for the next loop round
+                break
+            items.append(item)
+        return items
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP: return
+            try:
+                self.dispatch(item if self.batch_size is None else self.collect(item))
+            except Exception as e:
+                print(f"Stage '{self.name}' Error: {e}")
+                traceback.print_exc()
+
+    def dispatch(self, work):
+        results = self.func(work)
+        if self.batch_size is None: results = [results]
+        # A full downstream queue blocks this worker, which in turn stops it
+        # pulling from its own queue - that is the backpressure.
+        for result in results:
+            if result is not None and self.next is not None:
+                self.next.queue.put(result)
+
+    def stop(self):
+        for _ in self.threads: self.queue.put(_STOP)
+        for t in self.threads: t.join()
+        self.threads = []
+
+class AsyncStage(Stage):
+    """Stage whose func is a coroutine function run on an AsyncEngine.
+
+    Its worker threads only hand work to the event loop, so the number of
+    requests in flight is set by the engine, not by the thread count."""
+
+    def __init__(self, name, func, engine, workers=1, queue_size=0, batch_size=None, batch_wait=0):
+        super().__init__(name, func, workers, queue_size, batch_size, batch_wait)
+        self.engine = engine
+
+    def dispatch(self, work):
+        # Blocks while the engine is at max_in_flight.
+        self.engine.submit(self.handle(work))
+
+    def stop(self):
+        super().stop()
+        # Results of requests still in flight go to the next stage, so it has to wait for them.
+        self.engine.drain()
+
+    async def handle(self, work):
+        results = await self.func(work)
+        if self.batch_size is None: results = [results]
+        for result in results:
+            if result is not None and self.next is not None:
+                await asyncio.to_thread(self.next.queue.put, result)
+
+class StagedPipeline:
+    """Chain of stages, each with its own worker pool and bounded input queue.
+
+    A stage function gets one item and returns the item for the next stage,
+    or None to drop it."""
+
+    def __init__(self):
+        self.stages = []
+        self.running = False
+
+    def add_stage(self, name, func, workers=1, queue_size=0, batch_size=None, batch_wait=0):
+        stage = Stage(name, func, workers, queue_size, batch_size, batch_wait)
+        if self.stages: self.stages[-1].next = stage
+        self.stages.append(stage)
+        return stage
+
+    def add_async_stage(self, name, func, engine, workers=1, queue_size=0, batch_size=None, batch_wait=0):
+        stage = AsyncStage(name, func, engine, workers, queue_size, batch_size, batch_wait)
+        if self.stages: self.stages[-1].next = stage
+        self.stages.append(stage)
+        return stage
+
+    def start(self):
+        for s in self.stages: s.start()
+        self.running = True
+
+    def submit(self, item, block=True, timeout=None, stage=None):
+        # Blocks while the stage (default: the first) is full (unless block=False / timeout).
+        # A named stage lets work that already went through the earlier ones skip them.
+        target = self.stages[0] if stage is None else next(s for s in self.stages if s.name == stage)
+        try:
+            target.queue.put(item, block=block, timeout=timeout)
+            return True
+        except queue.Full:
+            return False
+
+    def stop(self):
+        # Stop stages front to back so everything already queued drains through.
+        self.running = False
+        for s in self.stages: s.stop()
+
+    def depths(self):
+        return {s.name: s.queue.qsize() for s in self.stages}
@@ -0,0 +1,52 @@
+import io
+import os
+from PIL import Image
+
+# A 2-5 word filename doesn't need a full-resolution ultrawide capture.
+DEFAULT_MAX_SIDE = 1568
+DEFAULT_FORMAT = "JPEG"
+DEFAULT_QUALITY = 80
+
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+def prepare_image(file_path, max_side=DEFAULT_MAX_SIDE, fmt=DEFAULT_FORMAT, quality=DEFAULT_QUALITY):
+    """Downscale and re-encode an image for upload. The file on disk is not touched.
+
+    Returns (data, mime_type, info) where info has the original/encoded sizes."""
+    fmt = (fmt or DEFAULT_FORMAT).upper()
+    if fmt == "JPG": fmt = "JPEG"
+    if fmt not in MIME_TYPES: fmt = DEFAULT_FORMAT
+
+    original_bytes = os.path.getsize(file_path)
+    with Image.open(file_path) as img:
+        # draft() lets the JPEG decoder skip straight to a reduced scale.
+        if max_side: img.draft("RGB", (max_side, max_side))
+        if img.mode != "RGB":
+            if "A" in img.getbands() or img.mode == "P":
+                img = img.convert("RGBA")
+                bg = Image.new("RGB", img.size, (255, 255, 255))
+                bg.paste(img, mask=img.getchannel("A"))
+                img = bg
+            else:
+                img = img.convert("RGB")
+        if max_side and max(img.size) > max_side:
+            img.thumbnail((max_side, max_side), Image.LANCZOS)
+        size = img.size
+        buf = io.BytesIO()
+        img.save(buf, format=fmt, quality=int(quality), optimize=(fmt == "JPEG"))
+
+    data = buf.getvalue()
+    info = {
+        "original_bytes": original_bytes,
+        "upload_bytes": len(data),
+        "saved_bytes": original_bytes - len(data),
+        "size": size,
+    }
+    return data, MIME_TYPES[fmt], info
+
+def format_report(file_path, info, request_time, batch=1):
+    """request_time is the one API request that carried the whole batch, not this file's share of it."""
+    kb = lambda n: f"{n / 1024:.0f} KB"
+    shared = f", request for {batch} images" if batch > 1 else ""
+    return (f"Upload {os.path.basename(file_path)}: {kb(info['original_bytes'])} -> {kb(info['upload_bytes'])} "
+            f"(saved {kb(info['saved_bytes'])}, {info['size'][0]}x{info['size'][1]}) in {request_time:.2f}s{shared}")
@@ -0,0 +1,164 @@
+import re
+import math
+import time
+import random
+import asyncio
+import threading
+import metrics
+
+# Gemini free tier for gemini-2.5-flash; raise them in app_config.json on a paid key.
+DEFAULT_RPM = 10
+DEFAULT_TPM = 250000
+DEFAULT_MAX_RETRIES = 5
+BASE_DELAY = 2
+MAX_DELAY = 60
+
+RETRYABLE_CODES = (429, 500, 502, 503, 504)
+RETRYABLE_STATUS = ("429", "resource_exhausted", "unavailable", "deadline_exceeded")
+RETRY_HINTS = (re.compile(r"retry in ([\d.]+)\s*s", re.I), re.compile(r"retryDelay['\"]?\s*:\s*['\"]([\d.]+)s"))
+
+def image_tokens(width, height):
+    # Gemini bills small images as one 258-token tile, larger ones per 768x768 tile.
+    if width <= 384 and height <= 384: return 258
+    return math.ceil(width / 768) * math.ceil(height / 768) * 258
+
+def estimate_tokens(prompt, sizes, output_per_image=100):
+    """Rough token cost of one request: prompt text, image tiles and the JSON reply."""
+    return len(prompt) // 4 + sum(image_tokens(w, h) for w, h in sizes) + output_per_image * max(1, len(sizes))
+
+class TokenBucket:
+    """Refills at per_minute / 60 per second up to per_minute.
+
+    reserve() always succeeds and returns how long the caller has to wait
+    for its share; the balance may go negative, so waiters queue up in
+    order instead of all retrying at once."""
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount, now):
+        self.refill(now)
+        amount = min(amount, self.capacity)  # a single huge request still has to get through
+        self.tokens -= amount
+        return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self, amount, now):
+        self.refill(now)
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute budget shared by every caller,
+    plus retries with exponential backoff and full jitter.
+
+    A rate-limit reply pauses everyone until its retry hint (or the backoff)
+    has passed, not just the worker that got it."""
+
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, max_retries=DEFAULT_MAX_RETRIES):
+        self.lock = threading.Lock()
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.max_retries = max_retries
+        self.paused_until = 0
+        self.settings = (rpm, tpm, max_retries)
+
+    def reserve(self, tokens):
+        """Seconds to wait before sending a request of about `tokens` tokens."""
+        with self.lock:
+            now = time.monotonic()
+            wait = max(0, self.paused_until - now)
+            if self.requests: wait = max(wait, self.requests.reserve(1, now))
+            if self.tokens: wait = max(wait, self.tokens.reserve(tokens, now))
+            return wait
+
+    def settle(self, estimated, response):
+        # Correct the token bucket with what the reply says was actually used.
+        usage = getattr(response, "usage_metadata", None)
+        actual = getattr(usage, "total_token_count", None) if usage else None
+        if not self.tokens or not actual: return
+        with self.lock:
+            self.tokens.refund(estimated - actual, time.monotonic())
+
+    def retry_delay(self, error, attempt):
+        """Seconds to wait before retrying after error, or None if it shouldn't be retried."""
+        msg = str(error).lower()
+        code = getattr(error, "code", None)
+        if isinstance(code, int): retryable = code in RETRYABLE_CODES
+        else: retryable = any(s in msg for s in RETRYABLE_STATUS)
+        if attempt >= self.max_retries or not retryable: return None
+        hint = self.retry_hint(error)
+        delay = hint if hint is not None else random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt))
+        if code == 429 or "resource_exhausted" in msg or "429" in msg:
+            with self.lock: self.paused_until = max(self.paused_until, time.monotonic() + delay)
+        return delay
+
+    def retry_hint(self, error):
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None)
+        if headers:
+            try: return float(headers.get("retry-after"))
+            except (TypeError, ValueError): pass
+        for pattern in RETRY_HINTS:
+            m = pattern.search(str(error))
+            if m: return float(m.group(1)) + random.uniform(0, 1)
+        return None
+
+    def call(self, request, tokens=0):
+        """request() under the budget, retried on rate limits and server errors."""
+        attempt = 0
+        while True:
+            wait = self.reserve(tokens)
+            if wait:
+                metrics.observe("rate_limit", wait)
+                time.sleep(wait)
+            try:
+                response = request()
+                self.settle(tokens, response)
+                return response
+            except Exception as e:
+                delay = self.retry_delay(e, attempt)
+                if delay is None: raise
+                print(f"Rate Limit: retry {attempt + 1}/{self.max_retries} in {delay:.1f}s ({e})")
+                metrics.inc("retries")
+                time.sleep(delay)
+                attempt += 1
+
+    async def call_async(self, request, tokens=0):
+        """Same as call() for a coroutine factory; waits without blocking the loop."""
+        attempt = 0
+        while True:
+            wait = self.reserve(tokens)
+            if wait:
+                metrics.observe("rate_limit", wait)
+                await asyncio.sleep(wait)
+            try:
+                response = await request()
+                self.settle(tokens, response)
+                return response
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                delay = self.retry_delay(e, attempt)
+                if delay is None: raise
+                print(f"Rate Limit: retry {attempt + 1}/{self.max_retries} in {delay:.1f}s ({e})")
+                metrics.inc("retries")
+                await asyncio.sleep(delay)
+                attempt += 1
+
+_lock = threading.Lock()
+_limiter = None
+
+def get_limiter(rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, max_retries=DEFAULT_MAX_RETRIES):
+    """Process-wide limiter, so the watcher, backfill and every worker share one budget.
+    Rebuilt only when the settings change."""
+    global _limiter
+    with _lock:
+        if _limiter is None or _limiter.settings != (rpm, tpm, max_retries):
+            _limiter = RateLimiter(rpm, tpm, max_retries)
+        return _limiter
@@ -0,0 +1,142 @@
+import os
+import time
+import threading
+import traceback
+from collections import OrderedDict
+
+MIN_INTERVAL = 0.05
+MAX_INTERVAL = 1.0
+STABLE_CHECKS = 2
+TIMEOUT = 60
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns
+    except OSError:
+        return None
+
+def wait_until_ready(path, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL,
+                     stable_checks=STABLE_CHECKS, timeout=TIMEOUT):
+    """Blocking version for one file: True once size and mtime stop changing."""
+    deadline = time.monotonic() + timeout
+    last, stable, interval = _stat(path), 0, min_interval
+    while time.monotonic() < deadline:
+        time.sleep(interval)
+        cur = _stat(path)
+        if cur is None: return False
+        if cur == last and cur[0] > 0:
+            stable += 1
+            if stable >= stable_checks: return True
+            interval = min(interval * 2, max_interval)
+        else:
+            last, stable, interval = cur, 0, min_interval
+    return False
+
+class ReadinessTracker:
+    """Decides when a newly created file has finished being written.
+
+    Created/modified events for the same path are coalesced into one pending
+    entry. A close-after-write event (where the platform has one) hands the
+    file off straight away; otherwise it is handed off once its size and
+    mtime have held still for stable_checks polls. The poll interval starts
+    at min_interval and backs off while the file keeps growing. on_drop gets
+    the paths it gives up on (deleted, or still changing at the timeout)."""
+
+    def __init__(self, on_ready, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL,
+                 stable_checks=STABLE_CHECKS, timeout=TIMEOUT, on_drop=None):
+        self.on_ready = on_ready
+        self.on_drop = on_drop
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.stable_checks = stable_checks
+        self.timeout = timeout
+        self.pending = {}
+        self.dropped = []
+        # Paths handed off recently, with the stat they had, so a late
+        # modified/closed event for the same write doesn't process it twice.
+        self.done = OrderedDict()
+        self.cond = threading.Condition()
+        self.running = True
+        self.draining = False
+        self.thread = threading.Thread(target=self.run, name="readiness", daemon=True)
+        self.thread.start()
+
+    def touch(self, path, create=True, force=False):
+        """Created/modified event. create=False only refreshes paths already pending;
+        force=True re-queues a path even if it was just handed off."""
+        now = time.monotonic()
+        with self.cond:
+            state = self.pending.get(path)
+            if state is None:
+                if not create: return
+                cur = _stat(path)
+                if cur is not None and not force and self.done.get(path) == cur: return
+                self.pending[path] = {"stat": cur, "stable": 0, "interval": self.min_interval,
+                                      "next": now + self.min_interval, "deadline": now + self.timeout}
+            else:
+                # More writes: start counting stability again from the fastest interval.
+                state.update(stable=0, interval=self.min_interval, next=now + self.min_interval)
+            self.cond.notify()
+
+    def closed(self, path):
+        """Writer closed the file: ready now, no polling needed."""
+        with self.cond:
+            if path not in self.pending: return
+            state = self.pending[path]
+            state.update(stable=self.stable_checks, stat=_stat(path), next=time.monotonic())
+            self.cond.notify()
+
+    def stop(self, drain=False):
+        """drain=True first hands off (or gives up on) every file still pending."""
+        with self.cond:
+            if drain: self.draining = True
+            else: self.running = False
+            self.cond.notify()
+        self.thread.join(timeout=None if drain else 5)
+
+    def poll(self, now):
+        ready = []
+        for path, state in list(self.pending.items()):
+            if state["next"] > now: continue
+            cur = _stat(path)
+            if cur is None:
+                del self.pending[path]  # deleted or moved away before it was finished
+                self.dropped.append(path)
+                continue
+            if state["stable"] >= self.stable_checks or (cur == state["stat"] and cur[0] > 0 and state["stable"] + 1 >= self.stable_checks):
+                del self.pending[path]
+                self.done[path] = cur
+                while len(self.done) > 1024: self.done.popitem(last=False)
+                ready.append(path)
+            elif now > state["deadline"]:
+                print(f"Gave up waiting for {os.path.basename(path)} to finish writing")
+                del self.pending[path]
+                self.dropped.append(path)
+            elif cur == state["stat"] and cur[0] > 0:
+                state["stable"] += 1
+                state["interval"] = min(state["interval"] * 2, self.max_interval)
+                state["next"] = now + state["interval"]
+            else:
+                state.update(stat=cur, stable=0, interval=self.min_interval, next=now + self.min_interval)
+        return ready
+
+    def run(self):
+        while True:
+            with self.cond:
+                if not self.running or (self.draining and not self.pending): return
+                ready = self.poll(time.monotonic())
+                dropped, self.dropped = self.dropped, []
+                if not ready and not dropped:
+                    wake = min((s["next"] for s in self.pending.values()), default=None)
+                    self.cond.wait(None if wake is None else max(0, wake - time.monotonic()))
+                    continue
+            # Outside the lock: on_ready may block on a full pipeline queue.
+            for path in dropped if self.on_drop else []:
+                try: self.on_drop(path)
+                except Exception as e: print(f"Readiness Error: {e}")
+            for path in ready:
+                try: self.on_ready(path)
+                except Exception as e:
+                    print(f"Readiness Error: {e}")
+                    traceback.print_exc()
@@ -0,0 +1,115 @@
+import os
+import json
+import atexit
+import hashlib
+import threading
+from collections import OrderedDict
+
+RESULT_CACHE_FILE = "result_cache.json"
+DEFAULT_MAX_ENTRIES = 5000
+SAVE_DELAY = 2.0
+
+def file_hash(file_path):
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def folders_signature(folders):
+    # Same image + different folder list can legitimately get a different answer.
+    items = sorted((f.get('name', ''), f.get('description', '')) for f in folders)
+    return hashlib.sha256(json.dumps(items).encode('utf-8')).hexdigest()[:16]
+
+class ResultCache:
+    """Persistent {content hash + model + folders -> {"filename", "folder"}} map with LRU eviction.
+
+    put() only marks the cache dirty; the file is rewritten at most once per
+    save_delay seconds (and on flush()), so a burst of answers costs one
+    write instead of one full rewrite each."""
+
+    def __init__(self, path=RESULT_CACHE_FILE, max_entries=DEFAULT_MAX_ENTRIES, save_delay=SAVE_DELAY):
+        self.path = path
+        self.max_entries = max_entries
+        self.save_delay = save_delay
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        self.timer = None
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path): return
+        try:
+            with open(self.path, 'r') as f: data = json.load(f)
+            # Stored oldest-first, so insertion order is the LRU order.
+            for k, v in data.get("entries", []): self.entries[k] = v
+        except: pass
+
+    def save(self):
+        # Unique temp name: another process (GUI and daemon) may be saving the same file.
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with self.save_lock:
+            with self.lock:
+                self.dirty = False
+                self.timer = None
+                entries = list(self.entries.items())
+            with open(tmp, 'w') as f:
+                json.dump({"entries": entries}, f)
+            os.replace(tmp, self.path)
+
+    def schedule_save(self):
+        # Called with the lock held.
+        self.dirty = True
+        if self.timer is None:
+            self.timer = threading.Timer(self.save_delay, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self):
+        if not self.dirty: return
+        try: self.save()
+        except Exception as e: print(f"Cache Save Error: {e}")
+
+    def key(self, content_hash, model, folders):
+        return f"{content_hash}:{model}:{folders_signature(folders)}"
+
+    def get(self, key):
+        with self.lock:
+            result = self.entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return dict(result)
+
+    def put(self, key, result):
+        with self.lock:
+            self.entries[key] = {"filename": result.get("filename"), "folder": result.get("folder")}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.schedule_save()
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+_lock = threading.Lock()
+_cache = None
+
+def get_cache(max_entries=DEFAULT_MAX_ENTRIES, path=RESULT_CACHE_FILE):
+    """Process-wide cache, shared by the watcher and backfill handlers (and one
+    still draining after STOP) so they never rewrite the file over each other."""
+    global _cache
+    with _lock:
+        if _cache is None or _cache.path != path:
+            if _cache is not None: _cache.flush()
+            _cache = ResultCache(path, max_entries)
+            atexit.register(_cache.flush)  # answers from the last save_delay seconds
+        _cache.max_entries = max_entries
+        return _cache
@@ -0,0 +1,124 @@
+import os
+import sys
+import time
+import shutil
+import threading
+from result_cache import file_hash
+
+SORT_MODES = ("copy", "move", "hardlink", "reflink")
+DEFAULT_SORT_MODE = "reflink"
+FICLONE = 0x40049409  # linux/fs.h
+
+def reflink(src, dst):
+    """Copy-on-write clone of src at dst. Raises OSError where the filesystem can't."""
+    if sys.platform.startswith("linux"):
+        import fcntl
+        with open(src, 'rb') as s, open(dst, 'xb') as d:
+            try: fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+            except OSError:
+                d.close()
+                os.remove(dst)
+                raise
+    elif sys.platform == "darwin":
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) != 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), dst)
+    else:
+        raise OSError("reflink not supported on this platform")
+    shutil.copystat(src, dst)
+
+class Sorter:
+    """Puts a file into a smart folder by move, hard link, reflink or copy.
+
+    Hard links and reflinks fall back to a plain copy when the filesystem
+    (or a volume boundary) doesn't allow them. Before writing anything the
+    target folder is checked for a file with the same content; sizes per
+    folder are indexed once, so only same-size files ever get hashed."""
+
+    def __init__(self, mode=DEFAULT_SORT_MODE):
+        self.mode = mode if mode in SORT_MODES else DEFAULT_SORT_MODE
+        self.lock = threading.Lock()
+        self.dirs = {}  # folder -> {size: {path: (mtime_ns, hash or None)}}
+
+    def index(self, target_dir):
+        k = os.path.normcase(os.path.abspath(target_dir))
+        sizes = self.dirs.get(k)
+        if sizes is None:
+            sizes = self.dirs[k] = {}
+            with os.scandir(target_dir) as it:
+                for entry in it:
+                    try:
+                        if entry.is_file(follow_symlinks=False):
+                            sizes.setdefault(entry.stat().st_size, {})[entry.path] = (None, None)
+                    except OSError: pass
+        return sizes
+
+    def find_duplicate(self, target_dir, src, size, content_hash=None):
+        with self.lock: candidates = list(self.index(target_dir).get(size, {}).items())
+        for path, (mtime, digest) in candidates:
+            try:
+                st = os.stat(path)
+                if st.st_size != size: raise OSError
+                if digest is None or mtime != st.st_mtime_ns:
+                    digest = file_hash(path)
+                    with self.lock: self.index(target_dir).setdefault(size, {})[path] = (st.st_mtime_ns, digest)
+            except OSError:
+                with self.lock: self.index(target_dir).get(size, {}).pop(path, None)
+                continue
+            if content_hash is None: content_hash = file_hash(src)
+            if digest == content_hash: return path
+        return None
+
+    def copy(self, src, dst):
+        # Via a temp name, so a crash never leaves a half-written file under the real name.
+        tmp = dst + ".part"
+        try:
+            shutil.copy2(src, tmp)
+            os.replace(tmp, dst)
+        except BaseException:
+            try: os.remove(tmp)
+            except OSError: pass
+            raise
+
+    def place(self, src, dst):
+        if self.mode == "move":
+            try: os.rename(src, dst)
+            except OSError:  # another drive
+                self.copy(src, dst)
+                os.remove(src)
+            return "move"
+        if self.mode == "hardlink":
+            try:
+                os.link(src, dst)
+                return "hardlink"
+            except OSError: pass
+        elif self.mode == "reflink":
+            try:
+                reflink(src, dst)
+                return "reflink"
+            except OSError: pass
+        self.copy(src, dst)
+        return "copy"
+
+    def sort(self, src, target_dir, content_hash=None):
+        """Returns (path in target_dir, how) where how is "duplicate" if an identical file was already there."""
+        os.makedirs(target_dir, exist_ok=True)
+        size = os.path.getsize(src)
+        existing = self.find_duplicate(target_dir, src, size, content_hash)
+        if existing:
+            if self.mode == "move": os.remove(src)
+            return existing, "duplicate"
+
+        filename = os.path.basename(src)
+        target_path = os.path.join(target_dir, filename)
+        if os.path.exists(target_path):
+            base, ext = os.path.splitext(filename)
+            target_path = os.path.join(target_dir, f"{base}_{int(time.time())}{ext}")
+
+        how = self.place(src, target_path)
+        mtime = os.stat(target_path).st_mtime_ns
+        with self.lock:
+            self.index(target_dir).setdefault(size, {})[target_path] = (mtime, content_hash)
+        return target_path, how
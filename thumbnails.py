@@ -0,0 +1,81 @@
+import os
+import hashlib
+import threading
+from PIL import Image
+
+THUMBNAIL_DIR = "thumbnails"
+THUMBNAIL_WIDTH = 500  # gallery cards are 250px wide; 2x keeps them sharp on HiDPI
+MAX_CACHE_BYTES = 200 * 1024 * 1024
+
+class ThumbnailCache:
+    """Fixed-width WebP thumbnails keyed by source path + mtime + size.
+
+    An edited or replaced file gets a new key, so stale thumbnails are never
+    served; they just age out. The directory is kept under max_bytes by
+    deleting the least recently used thumbnails (hits refresh the mtime).
+    With scan=False the directory size starts at 0 until measure() runs, so
+    the GUI can do that off the main thread."""
+
+    def __init__(self, directory=THUMBNAIL_DIR, width=THUMBNAIL_WIDTH, max_bytes=MAX_CACHE_BYTES, scan=True):
+        self.directory = directory
+        self.width = width
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.total = 0
+        if scan: self.measure()
+
+    def measure(self):
+        os.makedirs(self.directory, exist_ok=True)
+        total = sum(e.stat().st_size for e in os.scandir(self.directory) if e.is_file())
+        with self.lock:
+            self.total = total
+            if self.total > self.max_bytes: self.evict()
+
+    def key(self, src):
+        st = os.stat(src)
+        raw = f"{os.path.abspath(src)}|{st.st_mtime_ns}|{st.st_size}|{self.width}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def thumb_path(self, src):
+        return os.path.join(self.directory, self.key(src) + ".webp")
+
+    def ensure(self, src):
+        """Path of the thumbnail for src, generating it if needed."""
+        path = self.thumb_path(src)
+        if os.path.exists(path):
+            try: os.utime(path)
+            except OSError: pass
+            return path
+
+        with Image.open(src) as img:
+            img.draft("RGB", (self.width, self.width * 4))
+            if img.mode not in ("RGB", "RGBA"): img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+            if img.width > self.width:
+                img = img.resize((self.width, max(1, round(img.height * self.width / img.width))), Image.LANCZOS)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            os.makedirs(self.directory, exist_ok=True)
+            img.save(tmp, format="WEBP", quality=80, method=4)
+        os.replace(tmp, path)
+
+        with self.lock:
+            self.total += os.path.getsize(path)
+            if self.total > self.max_bytes: self.evict()
+        return path
+
+    def load(self, src):
+        """Thumbnail as a loaded PIL image (file handle already closed)."""
+        with Image.open(self.ensure(src)) as img:
+            img.load()
+            return img
+
+    def evict(self):
+        entries = sorted((e.stat().st_mtime, e.stat().st_size, e.path) for e in os.scandir(self.directory) if e.is_file())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.8  # free a chunk so we don't evict on every insert
+        for _, size, path in entries:
+            if total <= target: break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError: pass
+        self.total = total